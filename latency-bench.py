@@ -0,0 +1,642 @@
+#!/usr/bin/env python3
+"""
+Banc d'essai hors ligne de l'orchestrateur latency-multi-geo.py
+Exécute main() contre des substituts locaux : API Vultr v2 factice, "instances" qui lancent la sonde
+générée en local à la place de SSH, endpoints HTTP à latence injectée. Mesure la durée de chaque phase,
+le CPU et la mémoire de l'orchestrateur, et l'erreur de mesure par rapport à la latence injectée.
+Requis: pip install aiohttp requests pandas pyarrow
+"""
+
+import argparse
+import asyncio
+import base64
+import functools
+import importlib.util
+import itertools
+import json
+import math
+import os
+import random
+import re
+import resource
+import shutil
+import stat
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple
+from urllib.parse import parse_qs, urlparse
+
+ORCHESTRATOR_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "latency_multi_geo.py")
+# Plan annoncé disponible par l'API factice (celui que demande l'orchestrateur)
+BENCH_PLAN_ID = "vc2-1c-2gb"
+# Adresses des instances factices (TEST-NET-1, jamais routées : seul le shim SSH les connaît)
+BENCH_IP_PREFIX = "192.0.2."
+# Marges absolues des comparaisons avec une référence (--baseline) : bruit d'une machine à l'autre
+BASELINE_SLACK = {'wall_s': 0.5, 'cpu_s': 0.2, 'p50_error_ms': 0.5, 'p99_error_ms': 2.0}
+
+# Shim installé sous les noms "ssh" et "scp" en tête du PATH de l'orchestrateur :
+# root@<ip>:/root/... devient <instances>/<ip>/..., le reste de la commande est exécuté en local
+SSH_SHIM = r'''#!{python}
+import os
+import shutil
+import sys
+
+INSTANCES = {instances!r}
+PYTHON = {python!r}
+
+
+def home(target):
+    host = target.split('@', 1)[1]
+    path = os.path.join(INSTANCES, host)
+    if not os.path.isdir(path):
+        sys.stderr.write(f"ssh: connect to host {{host}} port 22: Connection refused\n")
+        sys.exit(255)
+    return path
+
+
+args = sys.argv[1:]
+if os.path.basename(sys.argv[0]) == 'scp':
+    source, target = args[-2], args[-1]
+    host, path = target.split(':', 1)
+    shutil.copyfile(source, path.replace('/root/', home(host) + '/'))
+    sys.exit(0)
+index = next(i for i, arg in enumerate(args) if arg.startswith('root@'))
+root = home(args[index])
+command = ' '.join(args[index + 1:]).replace('/root/', root + '/').replace('python3 ', PYTHON + ' ')
+os.execvp('bash', ['bash', '-c', command])
+'''
+
+
+def load_orchestrator():
+    """Charge latency_multi_geo.py comme module depuis son chemin (indépendant du répertoire courant)"""
+    spec = importlib.util.spec_from_file_location("latency_multi_geo", ORCHESTRATOR_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def quantile(values: List[float], q: float) -> float:
+    """Quantile par rang (même convention que l'histogramme de l'orchestrateur)"""
+    if not values:
+        return math.nan
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+class LatencyModel:
+    """Latence injectée par (région, exchange) : log-normale de médiane donnée, pics de queue optionnels.
+    La durée réellement attendue par chaque requête servie est conservée : c'est la vérité terrain."""
+
+    def __init__(self, medians_ms: List[float], sigma: float, spike_prob: float, spike_ms: float, seed: int):
+        self.medians_ms = medians_ms
+        self.sigma = sigma
+        self.spike_prob = spike_prob
+        self.spike_ms = spike_ms
+        self.random = random.Random(seed)
+        self.injected: Dict[Tuple[str, str], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def median(self, region_index: int, exchange_index: int) -> float:
+        return self.medians_ms[(region_index + exchange_index) % len(self.medians_ms)]
+
+    def draw(self, median_ms: float) -> float:
+        with self._lock:
+            delay = median_ms * math.exp(self.random.gauss(0.0, self.sigma))
+            if self.random.random() < self.spike_prob:
+                delay += self.spike_ms
+        return delay
+
+    def record(self, pair: Tuple[str, str], waited_ms: float):
+        with self._lock:
+            self.injected.setdefault(pair, []).append(waited_ms)
+
+
+class EndpointServer:
+    """Endpoints HTTP locaux (aiohttp) : GET /<région>/<exchange> répond après la latence injectée"""
+
+    def __init__(self, model: LatencyModel):
+        self.model = model
+        self.medians: Dict[Tuple[str, str], float] = {}
+        self.port = None
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._runner = None
+
+    async def _handle(self, request):
+        from aiohttp import web
+        pair = (request.match_info['region'], request.match_info['exchange'])
+        median = self.medians.get(pair)
+        if median is None:
+            raise web.HTTPNotFound()
+        # Vérité terrain = attente effective (le réveil d'asyncio.sleep déborde de la valeur tirée)
+        start = time.perf_counter()
+        await asyncio.sleep(self.model.draw(median) / 1000.0)
+        self.model.record(pair, (time.perf_counter() - start) * 1000.0)
+        return web.json_response({'serverTime': int(time.time() * 1000)})
+
+    async def _start(self):
+        from aiohttp import web
+        app = web.Application()
+        app.router.add_get('/{region}/{exchange}', self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, '127.0.0.1', 0)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+
+    def _serve(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_until_complete(self._start())
+        self._ready.set()
+        self._loop.run_forever()
+
+    def start(self) -> "EndpointServer":
+        threading.Thread(target=self._serve, daemon=True).start()
+        self._ready.wait()
+        return self
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result(timeout=10)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+class FakeVultr:
+    """API Vultr v2 factice : régions, disponibilités, création/liste/lecture/suppression d'instances.
+    Une instance "démarre" après boot_delay (+ jitter) : la sonde est extraite du user_data (script
+    cloud-init réel) dans son répertoire, puis le marqueur de fin de cloud-init est écrit."""
+
+    def __init__(self, instances_dir: str, regions: List[str], boot_delay: float, boot_jitter: float,
+                 rate_limit: float, seed: int, stdlib_probe: bool = False):
+        self.instances_dir = instances_dir
+        self.regions = regions
+        self.boot_delay = boot_delay
+        self.boot_jitter = boot_jitter
+        self.rate_limit = rate_limit
+        self.stdlib_probe = stdlib_probe
+        self.random = random.Random(seed)
+        self.instances: Dict[str, Dict] = {}
+        self.requests: Dict[str, int] = {}
+        self.throttled = 0
+        self.created = 0
+        self.destroyed = 0
+        self._addresses = itertools.count(10)
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def start(self) -> "FakeVultr":
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+
+    @property
+    def leaked(self) -> List[str]:
+        return [instance['id'] for instance in self.instances.values() if instance['status'] != 'destroyed']
+
+    def _boot(self, instance: Dict, user_data: str):
+        time.sleep(max(0.0, self.boot_delay + self.random.uniform(0, self.boot_jitter)))
+        home = os.path.join(self.instances_dir, instance['main_ip'])
+        script = base64.b64decode(user_data).decode('utf-8')
+        probe = re.search(r"cat > /root/latency_test\.py << 'EOF'\n(.*?)^EOF$", script, re.S | re.M)
+        marker = re.search(r"date \+%s > (\S+)", script)
+        if probe is None or marker is None:
+            instance['status'] = 'error'
+            return
+        source = probe.group(1).replace('/root/', home + '/')
+        if self.stdlib_probe:
+            # Profil fast-boot : aiohttp absent de l'instance, la sonde se rabat sur la bibliothèque standard
+            source = "import sys\nsys.modules['aiohttp'] = None\n" + source
+        os.makedirs(home, exist_ok=True)
+        with open(os.path.join(home, 'latency_test.py'), 'w') as f:
+            f.write(source)
+        with open(marker.group(1).replace('/root/', home + '/'), 'w') as f:
+            f.write(str(int(time.time())))
+        if instance['status'] == 'pending':
+            instance.update(status='active', power_status='running', server_status='ok')
+
+    def _handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, code: int, payload: Dict = None, headers: Dict = None):
+                body = json.dumps(payload).encode() if payload is not None else b''
+                self.send_response(code)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _throttled(self, route: str) -> bool:
+                with api._lock:
+                    api.requests[route] = api.requests.get(route, 0) + 1
+                    throttled = api.random.random() < api.rate_limit
+                    api.throttled += throttled
+                if throttled:
+                    self._send(429, {'error': 'Rate limit exceeded', 'status': 429}, {'Retry-After': '1'})
+                return throttled
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                parts = url.path.strip('/').split('/')
+                if parts == ['regions']:
+                    if not self._throttled('GET /regions'):
+                        self._send(200, {'regions': [{'id': code, 'city': f"Bench {code}"} for code in api.regions],
+                                         'meta': {'links': {'next': ''}}})
+                elif len(parts) == 3 and parts[0] == 'regions' and parts[2] == 'availability':
+                    if not self._throttled('GET /regions/availability'):
+                        self._send(200, {'available_plans': [BENCH_PLAN_ID] if parts[1] in api.regions else []})
+                elif parts == ['instances']:
+                    if self._throttled('GET /instances'):
+                        return
+                    query = parse_qs(url.query)
+                    tag, label = query.get('tag', [None])[0], query.get('label', [None])[0]
+                    per_page = int(query.get('per_page', ['100'])[0])
+                    offset = int(query.get('cursor', ['0'])[0] or 0)
+                    matching = [instance for instance in list(api.instances.values())
+                                if instance['status'] != 'destroyed'
+                                and (tag is None or tag in instance['tags'])
+                                and (label is None or instance['label'] == label)]
+                    page = matching[offset:offset + per_page]
+                    cursor = str(offset + per_page) if offset + per_page < len(matching) else ''
+                    self._send(200, {'instances': page, 'meta': {'links': {'next': cursor}}})
+                elif len(parts) == 2 and parts[0] == 'instances':
+                    if self._throttled('GET /instances/{id}'):
+                        return
+                    instance = api.instances.get(parts[1])
+                    if instance is None or instance['status'] == 'destroyed':
+                        self._send(404, {'error': 'Invalid instance-id.', 'status': 404})
+                    else:
+                        self._send(200, {'instance': instance})
+                else:
+                    self._send(404, {'error': 'Not found', 'status': 404})
+
+            def do_POST(self):
+                if urlparse(self.path).path.rstrip('/') != '/instances':
+                    self._send(404, {'error': 'Not found', 'status': 404})
+                    return
+                data = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                if self._throttled('POST /instances'):
+                    return
+                if data.get('region') not in api.regions or data.get('plan') != BENCH_PLAN_ID:
+                    self._send(400, {'error': 'Invalid region or plan', 'status': 400})
+                    return
+                with api._lock:
+                    instance = {
+                        'id': str(uuid.uuid4()),
+                        'region': data['region'],
+                        'plan': data['plan'],
+                        'label': data.get('label', ''),
+                        'tags': data.get('tags', []),
+                        'main_ip': f"{BENCH_IP_PREFIX}{next(api._addresses)}",
+                        'status': 'pending',
+                        'power_status': 'stopped',
+                        'server_status': 'none',
+                        'date_created': time.strftime('%Y-%m-%dT%H:%M:%S+00:00', time.gmtime()),
+                    }
+                    api.instances[instance['id']] = instance
+                    api.created += 1
+                threading.Thread(target=api._boot, args=(instance, data.get('user_data', '')), daemon=True).start()
+                self._send(202, {'instance': instance})
+
+            def do_DELETE(self):
+                parts = urlparse(self.path).path.strip('/').split('/')
+                if self._throttled('DELETE /instances/{id}'):
+                    return
+                instance = api.instances.get(parts[-1]) if len(parts) == 2 and parts[0] == 'instances' else None
+                if instance is None or instance['status'] == 'destroyed':
+                    self._send(404, {'error': 'Invalid instance-id.', 'status': 404})
+                    return
+                instance['status'] = 'destroyed'
+                with api._lock:
+                    api.destroyed += 1
+                shutil.rmtree(os.path.join(api.instances_dir, instance['main_ip']), ignore_errors=True)
+                self._send(204)
+
+        return Handler
+
+
+def timed(timings: Dict[str, List[float]], phase: str, function):
+    """Enveloppe une fonction (sync ou async) pour cumuler ses durées murales sous `phase`"""
+    if asyncio.iscoroutinefunction(function):
+        @functools.wraps(function)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await function(*args, **kwargs)
+            finally:
+                timings.setdefault(phase, []).append(time.perf_counter() - start)
+    else:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                timings.setdefault(phase, []).append(time.perf_counter() - start)
+    return wrapper
+
+
+def run_orchestrator(config_path: str) -> int:
+    """Processus enfant : main() de l'orchestrateur instrumenté, endpoints remplacés par les endpoints locaux"""
+    with open(config_path) as f:
+        config = json.load(f)
+    module = load_orchestrator()
+    module.REGION_EXCHANGE_MAP.clear()
+    module.REGION_EXCHANGE_MAP.update(config['region_map'])
+    module.SERVER_TIME_URLS.clear()
+
+    # Phases du pipeline : une entrée par appel (une mesure = un appel à test_all_regions)
+    timings: Dict[str, List[float]] = {}
+    for owner, name, phase in [
+        (module.VultrDeployer, 'create_instances', 'provision'),
+        (module.VultrDeployer, 'wait_for_instances', 'boot'),
+        (module.LatencyTester, '_wait_for_ssh', 'ssh_ready'),
+        (module.LatencyTester, 'test_from_region', 'remote'),
+        (module.LatencyTester, 'test_all_regions', 'measure'),
+        (module.LatencyAggregator, 'add_rows', 'aggregate'),
+        (module.ResultsStore, 'append', 'store'),
+        (module.ResultsStore, 'compact', 'store'),
+        (module.ResultsStore, 'summary_index', 'store'),
+        (module.VultrDeployer, 'destroy_instances', 'teardown'),
+    ]:
+        setattr(owner, name, timed(timings, phase, getattr(owner, name)))
+    module.print_report = timed(timings, 'report', module.print_report)
+
+    start = time.perf_counter()
+    try:
+        with module.TRACER.span('run'):
+            # Mode non interactif : durée et destruction fixées, aucune invite
+            asyncio.run(timed(timings, 'total', module.main)(
+                regions=list(config['region_map']), minutes=config['minutes'], destroy='always'))
+    finally:
+        module.TRACER.close()
+    wall = time.perf_counter() - start
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    with open(config['report'], 'w') as f:
+        json.dump({
+            'wall_s': wall,
+            'timings': timings,
+            'cpu_s': own.ru_utime + own.ru_stime,
+            'max_rss_mb': own.ru_maxrss / 1024.0,
+            'probe_cpu_s': children.ru_utime + children.ru_stime,
+        }, f)
+    return 0
+
+
+def install_shims(bin_dir: str, instances_dir: str):
+    """Écrit le shim ssh/scp (l'orchestrateur les appelle via le PATH)"""
+    os.makedirs(bin_dir, exist_ok=True)
+    source = SSH_SHIM.format(python=sys.executable, instances=instances_dir)
+    for name in ('ssh', 'scp'):
+        path = os.path.join(bin_dir, name)
+        with open(path, 'w') as f:
+            f.write(source)
+        os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
+
+def measurement_errors(module, store_path: str, model: LatencyModel, region_names: Dict[str, str]) -> List[Dict]:
+    """p50/p99 mesurés par l'orchestrateur (store) contre les latences injectées des requêtes servies"""
+    store = module.ResultsStore(store_path)
+    frame = store.read()
+    frame = frame[(frame['Method'] == 'http') & (frame['Edge IP'] == '')]
+    summary = module.summarize_latencies(frame).set_index(['Region', 'Exchange']) if not frame.empty else None
+    rows = []
+    for (region, exchange), injected in sorted(model.injected.items()):
+        key = (region_names[region], exchange)
+        measured = summary.loc[key] if summary is not None and key in summary.index else None
+        truth_p50, truth_p99 = quantile(injected, 0.50), quantile(injected, 0.99)
+        p50 = float(measured['p50 (ms)']) if measured is not None else math.nan
+        p99 = float(measured['p99 (ms)']) if measured is not None else math.nan
+        rows.append({
+            'Region': region,
+            'Exchange': exchange,
+            'Injected': len(injected),
+            'Measured': int(measured['Count']) if measured is not None else 0,
+            'Truth p50 (ms)': round(truth_p50, 2),
+            'p50 (ms)': round(p50, 2),
+            'p50 error (ms)': round(p50 - truth_p50, 2),
+            'Truth p99 (ms)': round(truth_p99, 2),
+            'p99 (ms)': round(p99, 2),
+            'p99 error (ms)': round(p99 - truth_p99, 2),
+        })
+    return rows
+
+
+def missed_change_points(module, lengths=(6, 8, 9), seed: int = 0) -> List[int]:
+    """Historiques courts synthétiques (marche nette 100 -> 300 ms à mi-série, bruit 2 %) : longueurs où
+    analyze ne signale pas la rupture"""
+    import pandas as pd
+    rng = random.Random(seed)
+    missed = []
+    for n in lengths:
+        values = [(100.0 if i < n // 2 else 300.0) * (1 + rng.gauss(0, 0.02)) for i in range(n)]
+        index = pd.DataFrame({
+            'Region': 'Bench', 'Exchange': 'step', 'Type': 'CEX', 'Method': 'http', 'Edge IP': '',
+            'run_id': [f"run{i}" for i in range(n)],
+            'start': pd.date_range('2026-01-01', periods=n, freq='D'),
+            'p50': values,
+        })
+        change_points = module.analyze_history(index, 'p50', min_segment=2)['change_points']
+        if change_points.empty or change_points['Since run'].iloc[0] != f"run{n // 2}":
+            missed.append(n)
+    return missed
+
+
+def mean_abs(values: List[float]) -> float:
+    values = [abs(value) for value in values if not math.isnan(value)]
+    return sum(values) / len(values) if values else math.nan
+
+
+def compare_baseline(report: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Régressions par rapport à une référence : plus lent, plus de CPU ou moins précis au-delà de la tolérance"""
+    regressions = []
+    for metric, slack in BASELINE_SLACK.items():
+        current, reference = report['summary'].get(metric), baseline.get('summary', {}).get(metric)
+        if current is None or reference is None or math.isnan(current) or math.isnan(reference):
+            continue
+        if current > reference * (1 + tolerance) + slack:
+            regressions.append(f"{metric}: {current:.2f} (référence {reference:.2f})")
+    return regressions
+
+
+def print_bench_report(report: Dict):
+    summary = report['summary']
+    print("\n⏱️  Durée des phases (s, cumul des appels):")
+    for phase, durations in report['timings'].items():
+        print(f"  - {phase:<10} {sum(durations):8.2f}  ({len(durations)} appel(s), max {max(durations):.2f})")
+    print("\n🖥️  Orchestrateur:")
+    print(f"  - CPU: {summary['cpu_s']:.2f}s ({100.0 * summary['cpu_s'] / summary['wall_s']:.0f}% du temps mural)")
+    print(f"  - Mémoire max (RSS): {summary['max_rss_mb']:.0f} Mo")
+    print(f"  - CPU des sondes (processus enfants): {report['probe_cpu_s']:.2f}s")
+    api = report['api']
+    print("\n☁️  API Vultr factice:")
+    print(f"  - Requêtes: {sum(api['requests'].values())} ({api['throttled']} réponses 429)")
+    for route, count in sorted(api['requests'].items()):
+        print(f"      {route}: {count}")
+    print(f"  - Instances créées/détruites: {api['created']}/{api['destroyed']}")
+    if api['leaked']:
+        print(f"  ⚠️  Instances non détruites: {', '.join(api['leaked'])}")
+    print("\n🎯 Erreur de mesure (mesuré - injecté):")
+    errors = report['errors']
+    if errors:
+        import pandas as pd
+        print(pd.DataFrame(errors).to_string(index=False))
+        print(f"  - |erreur| moyenne p50: {summary['p50_error_ms']:.2f} ms, p99: {summary['p99_error_ms']:.2f} ms")
+    else:
+        print("⚠️  Aucune requête servie par les endpoints locaux.")
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="latency-bench.py",
+        description="Banc d'essai hors ligne : main() de latency-multi-geo.py contre une API Vultr, "
+                    "des instances et des endpoints locaux")
+    parser.add_argument("--regions", default="nrt,sgp,fra", help="régions simulées (séparées par des virgules)")
+    parser.add_argument("--exchanges", type=int, default=4, help="endpoints par région")
+    parser.add_argument("--medians", default="2,10,40",
+                        help="médianes de latence injectée (ms), attribuées en rotation aux paires")
+    parser.add_argument("--sigma", type=float, default=0.25, help="écart-type du log de la latence injectée")
+    parser.add_argument("--spike-prob", type=float, default=0.0, help="probabilité d'un pic de latence")
+    parser.add_argument("--spike-ms", type=float, default=100.0, help="latence ajoutée par un pic (ms)")
+    parser.add_argument("--samples", type=int, default=50, help="échantillons par endpoint (PROBE_SAMPLES)")
+    parser.add_argument("--minutes", type=float, default=0, help="durée du run en minutes (0 = une mesure)")
+    parser.add_argument("--boot-delay", type=float, default=1.0, help="démarrage d'une instance (s)")
+    parser.add_argument("--boot-jitter", type=float, default=0.5, help="variation du démarrage (s)")
+    parser.add_argument("--rate-limit", type=float, default=0.05, help="part des appels API répondus 429")
+    parser.add_argument("--stdlib-probe", action="store_true", help="sonde sans aiohttp (profil fast-boot)")
+    parser.add_argument("--seed", type=int, default=1, help="graine des tirages (latences, 429, démarrages)")
+    parser.add_argument("--json", dest="json_path", help="écrit le rapport JSON (référence pour --baseline)")
+    parser.add_argument("--baseline", help="rapport JSON de référence : code 1 en cas de régression")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="régression tolérée vs référence (0.2 = 20 %%)")
+    parser.add_argument("--keep", action="store_true", help="conserve le répertoire de travail")
+    parser.add_argument("--verbose", action="store_true", help="affiche la sortie de l'orchestrateur")
+    parser.add_argument("--orchestrator", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.orchestrator:
+        return run_orchestrator(args.orchestrator)
+
+    regions = [region.strip() for region in args.regions.split(',') if region.strip()]
+    medians = [float(value) for value in args.medians.split(',')]
+    workdir = tempfile.mkdtemp(prefix="latency-bench-")
+    instances_dir = os.path.join(workdir, "instances")
+    os.makedirs(instances_dir)
+    install_shims(os.path.join(workdir, "bin"), instances_dir)
+
+    model = LatencyModel(medians, args.sigma, args.spike_prob, args.spike_ms, args.seed)
+    endpoints = EndpointServer(model).start()
+    api = FakeVultr(instances_dir, regions, args.boot_delay, args.boot_jitter, args.rate_limit, args.seed,
+                    args.stdlib_probe).start()
+
+    region_names = {region: f"Bench {region}" for region in regions}
+    region_map = {}
+    for region_index, region in enumerate(regions):
+        cex = {}
+        for exchange_index in range(args.exchanges):
+            exchange = f"ex{exchange_index + 1}"
+            endpoints.medians[(region, exchange)] = model.median(region_index, exchange_index)
+            cex[exchange] = f"http://127.0.0.1:{endpoints.port}/{region}/{exchange}"
+        region_map[region] = {"name": region_names[region], "cex": cex, "dex": {}}
+
+    config_path = os.path.join(workdir, "bench.json")
+    child_report = os.path.join(workdir, "orchestrator.json")
+    with open(config_path, 'w') as f:
+        json.dump({'region_map': region_map, 'minutes': args.minutes, 'report': child_report}, f)
+
+    env = dict(os.environ)
+    env.update({
+        'PATH': os.path.join(workdir, "bin") + os.pathsep + env.get('PATH', ''),
+        'VULTR_API_URL': api.url,
+        'VULTR_API_KEY': 'bench',
+        'VULTR_POLL_MIN': '0.2',
+        'VULTR_POLL_MAX': '1',
+        'SSH_WAIT_DELAY': '0.5',
+        'SSH_CONTROL_PERSIST': '0',
+        'SSH_KEY_PATH': '',
+        'INSTANCE_POOL': '0',
+        'LIVE_DASHBOARD': '0',
+        'RESULTS_FORMAT': 'parquet',
+        'RESULTS_STORE_PATH': os.path.join(workdir, "store"),
+        'PROBE_SAMPLES': str(args.samples),
+        'PROBE_METHODS': 'http',
+    })
+    # Tous les endpoints locaux partagent l'hôte 127.0.0.1 : sans ce relèvement, le plafond de débit
+    # par hôte de la sonde (PROBE_HOST_RATE) sérialiserait la mesure
+    env.setdefault('PROBE_HOST_RATE', '1000')
+    print(f"🧪 Banc d'essai: {len(regions)} région(s) x {args.exchanges} endpoint(s), "
+          f"{args.samples} échantillons, répertoire {workdir}")
+    log_path = os.path.join(workdir, "orchestrator.log")
+    started = time.perf_counter()
+    with open(log_path, 'w') as log:
+        child = subprocess.run([sys.executable, os.path.abspath(__file__), "--orchestrator", config_path],
+                               env=env, cwd=workdir, stdin=subprocess.DEVNULL,
+                               stdout=None if args.verbose else log, stderr=subprocess.STDOUT if not args.verbose
+                               else None)
+    elapsed = time.perf_counter() - started
+    endpoints.stop()
+    api.stop()
+
+    if child.returncode != 0 or not os.path.exists(child_report):
+        print(f"❌ Orchestrateur en échec (code {child.returncode}), journal: {log_path}")
+        return 2
+    with open(child_report) as f:
+        orchestrator = json.load(f)
+    errors = measurement_errors(load_orchestrator(), os.path.join(workdir, "store"), model, region_names)
+    report = {
+        'timings': orchestrator['timings'],
+        'probe_cpu_s': orchestrator['probe_cpu_s'],
+        'api': {'requests': api.requests, 'throttled': api.throttled, 'created': api.created,
+                'destroyed': api.destroyed, 'leaked': api.leaked},
+        'errors': errors,
+        'summary': {
+            'wall_s': orchestrator['wall_s'],
+            'cpu_s': orchestrator['cpu_s'],
+            'max_rss_mb': orchestrator['max_rss_mb'],
+            'p50_error_ms': mean_abs([row['p50 error (ms)'] for row in errors]),
+            'p99_error_ms': mean_abs([row['p99 error (ms)'] for row in errors]),
+        },
+    }
+    print_bench_report(report)
+    print(f"\n🏁 Terminé en {elapsed:.1f}s")
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    status = 0
+    missing = [f"{row['Region']}/{row['Exchange']}" for row in errors if not row['Measured']]
+    if missing or len(errors) < len(endpoints.medians):
+        print(f"❌ Paires sans mesure: {', '.join(missing) or 'endpoints jamais appelés'}")
+        status = 1
+    if api.leaked:
+        status = 1
+    missed = missed_change_points(load_orchestrator(), seed=args.seed)
+    if missed:
+        print(f"❌ analyze: rupture nette non détectée sur des séries de {', '.join(map(str, missed))} runs")
+        status = 1
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_baseline(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"❌ Régression {regression}")
+        status = status or (1 if regressions else 0)
+    if args.keep:
+        print(f"📁 Répertoire conservé: {workdir}")
+    else:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
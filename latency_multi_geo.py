@@ -0,0 +1,3642 @@
+#!/usr/bin/env python3
+"""
+Script de déploiement Vultr multi-région et test de latence vers CEX/DEX
+Requis: pip install vultr-python requests aiohttp asyncio pandas rich
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import json
+import time
+import importlib
+from datetime import datetime
+from typing import TYPE_CHECKING, Callable, Dict, List, Tuple
+from collections import deque
+import tempfile
+import threading
+import signal
+import logging
+from logging.handlers import RotatingFileHandler
+from dotenv import load_dotenv
+import base64
+import fcntl
+import hashlib
+import uuid
+import socket
+from contextlib import contextmanager
+import math
+import bisect
+import contextvars
+import heapq
+import statistics
+import re
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote, urlparse
+
+
+class LazyModule:
+    """Module importé au premier accès à un attribut : --help, --dry-run et destroy démarrent sans
+    charger pandas, numpy, aiohttp, requests ni asyncio (plusieurs centaines de ms à l'import)"""
+
+    def __init__(self, name: str):
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+
+    def __getattr__(self, attr: str):
+        if self._module is None:
+            self.__dict__['_module'] = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+asyncio = LazyModule("asyncio")
+pd = LazyModule("pandas")
+np = LazyModule("numpy")
+aiohttp = LazyModule("aiohttp")
+requests = LazyModule("requests")
+
+if TYPE_CHECKING:
+    # rich n'est importé qu'à l'ouverture du tableau de bord ; ce nom ne sert qu'aux annotations
+    from rich.table import Table
+
+# Charger les variables depuis .env local (si présent)
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), ".env"), override=False)
+
+# Configuration
+VULTR_API_KEY = os.getenv("VULTR_API_KEY")  # Export your API key
+# Optional: attach Vultr SSH key(s) at instance creation (per Vultr API)
+VULTR_SSH_KEY_ID = os.getenv("VULTR_SSH_KEY_ID", "").strip()
+VULTR_SSH_KEY_IDS = os.getenv("VULTR_SSH_KEY_IDS", "").strip()  # comma-separated
+# Optional: local SSH private key to access instances (adds -i to ssh/scp)
+SSH_KEY_PATH = os.getenv("SSH_KEY_PATH", "").strip()
+# Optional: inject a public key via user_data as fallback
+SSH_PUBLIC_KEY = os.getenv("SSH_PUBLIC_KEY", "").strip()
+SSH_PUBLIC_KEY_PATH = os.getenv("SSH_PUBLIC_KEY_PATH", "").strip()
+# SSH connection timeout (seconds)
+SSH_CONNECT_TIMEOUT = int(os.getenv("SSH_CONNECT_TIMEOUT", "30"))
+# SSH wait loop (retries/delay) before tests
+SSH_WAIT_RETRIES = int(os.getenv("SSH_WAIT_RETRIES", "20"))
+SSH_WAIT_DELAY = float(os.getenv("SSH_WAIT_DELAY", "10"))
+# Attente de fin de cloud-init (marqueur de la sonde), hors timeout de mesure par région (secondes)
+BOOT_TIMEOUT = float(os.getenv("BOOT_TIMEOUT", "900"))
+# Tests par région exécutés en parallèle (plafond) et timeout par région (secondes)
+REGION_CONCURRENCY = int(os.getenv("REGION_CONCURRENCY", "8"))
+REGION_TIMEOUT = float(os.getenv("REGION_TIMEOUT", "240"))
+# Mode agent : sonde distante persistante qui publie ses mesures en continu (intervalle en secondes)
+AGENT_MODE = os.getenv("AGENT_MODE", "0").strip().lower() in ("1", "true", "yes")
+AGENT_INTERVAL = float(os.getenv("AGENT_INTERVAL", "5"))
+# Multiplexage SSH (ControlMaster) : durée de vie du socket maître en secondes (0 = désactivé)
+SSH_CONTROL_PERSIST = int(os.getenv("SSH_CONTROL_PERSIST", "120"))
+# Ordonnanceur de la sonde distante : échantillons par endpoint, écart entre vagues (s),
+# requêtes simultanées max et débit max par hôte (req/s)
+PROBE_SAMPLES = int(os.getenv("PROBE_SAMPLES", "10"))
+PROBE_INTERVAL = float(os.getenv("PROBE_INTERVAL", "0.1"))
+PROBE_MAX_INFLIGHT = int(os.getenv("PROBE_MAX_INFLIGHT", "16"))
+PROBE_HOST_RATE = float(os.getenv("PROBE_HOST_RATE", "10"))
+# Une connexion neuve par requête (mesures à froid uniquement) au lieu du keep-alive
+PROBE_FRESH_CONNECTIONS = os.getenv("PROBE_FRESH_CONNECTIONS", "0").strip().lower() in ("1", "true", "yes")
+# Colonne de classement du Top 10 : "p50" (latence totale) ou "warm_ttfb" (TTFB à chaud)
+RANK_METRIC = os.getenv("RANK_METRIC", "p50").strip().lower()
+# Méthodes de mesure : http (GET complet), tcp (connexion TCP seule), tls (connexion TCP + handshake TLS) ;
+# les pings tcp/tls ont leur propre volume, cadence et débit max par hôte
+PROBE_METHODS = [m.strip().lower() for m in os.getenv("PROBE_METHODS", "http").split(",") if m.strip()]
+PROBE_PING_SAMPLES = int(os.getenv("PROBE_PING_SAMPLES", "50"))
+PROBE_PING_INTERVAL = float(os.getenv("PROBE_PING_INTERVAL", "0.02"))
+PROBE_PING_HOST_RATE = float(os.getenv("PROBE_PING_HOST_RATE", "100"))
+# Flux WebSocket (méthode "ws") : durée de la connexion maintenue par mesure (s) et période des pings (s)
+PROBE_WS_DURATION = float(os.getenv("PROBE_WS_DURATION", "10"))
+PROBE_WS_PING_INTERVAL = float(os.getenv("PROBE_WS_PING_INTERVAL", "1"))
+# Mesure séparée de chaque adresse IPv4/IPv6 (edge CDN/anycast) d'un hôte, SNI/Host conservés ;
+# les adresses sont mises en cache selon le TTL DNS, plafonné à PROBE_DNS_TTL secondes
+PROBE_EDGES = os.getenv("PROBE_EDGES", "0").strip().lower() in ("1", "true", "yes")
+PROBE_DNS_TTL = float(os.getenv("PROBE_DNS_TTL", "300"))
+# Échantillonnage adaptatif : chaque paire est mesurée jusqu'à ce que l'IC à 95 % de ses p50/p99 soit plus
+# étroit que ADAPTIVE_CI_TARGET (demi-largeur relative, plancher ADAPTIVE_CI_FLOOR_MS) ou que son budget
+# d'ADAPTIVE_MAX_SAMPLES tentatives soit épuisé ; la durée choisie devient un plafond
+ADAPTIVE_SAMPLING = os.getenv("ADAPTIVE_SAMPLING", "0").strip().lower() in ("1", "true", "yes")
+ADAPTIVE_CI_TARGET = float(os.getenv("ADAPTIVE_CI_TARGET", "0.05"))
+ADAPTIVE_CI_FLOOR_MS = float(os.getenv("ADAPTIVE_CI_FLOOR_MS", "0.5"))
+ADAPTIVE_MAX_SAMPLES = int(os.getenv("ADAPTIVE_MAX_SAMPLES", "2000"))
+# Tableau de bord live (rich) et sa cadence de rafraîchissement (images/s)
+LIVE_DASHBOARD = os.getenv("LIVE_DASHBOARD", "0").strip().lower() in ("1", "true", "yes")
+LIVE_FPS = float(os.getenv("LIVE_FPS", "4"))
+# API Vultr : URL de base, appels simultanés, tentatives sur 429/5xx, intervalle de polling adaptatif (s)
+VULTR_API_URL = os.getenv("VULTR_API_URL", "https://api.vultr.com/v2").rstrip("/")
+VULTR_MAX_WORKERS = int(os.getenv("VULTR_MAX_WORKERS", "16"))
+VULTR_API_RETRIES = int(os.getenv("VULTR_API_RETRIES", "5"))
+VULTR_POLL_MIN = float(os.getenv("VULTR_POLL_MIN", "2"))
+VULTR_POLL_MAX = float(os.getenv("VULTR_POLL_MAX", "15"))
+# Pool d'instances réutilisées entre les runs : activation, fichier d'état, TTL d'inactivité (min)
+# et durée au-delà de laquelle le bail d'un run sur une autre machine est considéré abandonné (s)
+INSTANCE_POOL = os.getenv("INSTANCE_POOL", "0").strip().lower() in ("1", "true", "yes")
+POOL_STATE_PATH = os.getenv("POOL_STATE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".vultr-pool.json"))
+POOL_TTL_MINUTES = float(os.getenv("POOL_TTL_MINUTES", "30"))
+POOL_LEASE_TIMEOUT = float(os.getenv("POOL_LEASE_TIMEOUT", "21600"))
+POOL_TAG = "arb-test-pool"
+# Régions déployées hors mode matrice (codes séparés par des virgules ; --regions prioritaire)
+DEPLOY_REGIONS = [r.strip().lower() for r in os.getenv("DEPLOY_REGIONS", "nrt,sgp,fra,ewr,icn").split(",") if r.strip()]
+# Mode matrice : chaque exchange depuis chaque région Vultr découverte via l'API (MATRIX_REGIONS pour
+# restreindre, codes séparés par des virgules), endpoints répartis sur MATRIX_SHARDS instances par région
+MATRIX_MODE = os.getenv("MATRIX_MODE", "0").strip().lower() in ("1", "true", "yes")
+MATRIX_REGIONS = [r.strip().lower() for r in os.getenv("MATRIX_REGIONS", "").split(",") if r.strip()]
+MATRIX_SHARDS = max(1, int(os.getenv("MATRIX_SHARDS", "1")))
+# Stockage des résultats : "parquet" (store append-only partitionné par date et région, nécessite pyarrow)
+# ou "csv" (un fichier vultr_latency_test_<ts>_<N>m.csv par run)
+RESULTS_FORMAT = os.getenv("RESULTS_FORMAT", "parquet").strip().lower()
+RESULTS_STORE_PATH = os.getenv("RESULTS_STORE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "latency-store"))
+# Analyse historique (sous-commande analyze) : seuil de régression/rupture (%), nombre minimal de runs de part
+# et d'autre d'une rupture CUSUM, et statistique t minimale de l'écart avant/après
+ANALYZE_REGRESSION_PCT = float(os.getenv("ANALYZE_REGRESSION_PCT", "20"))
+ANALYZE_MIN_SEGMENT = int(os.getenv("ANALYZE_MIN_SEGMENT", "3"))
+ANALYZE_MIN_T = float(os.getenv("ANALYZE_MIN_T", "3"))
+# Instrumentation : spans des phases en JSON lines (TRACE_PATH) et métriques Prometheus au format texte
+# (METRICS_TEXTFILE, pour le textfile collector de node_exporter) ; vides = désactivé, coût quasi nul
+TRACE_PATH = os.getenv("TRACE_PATH", "").strip()
+METRICS_TEXTFILE = os.getenv("METRICS_TEXTFILE", "").strip()
+
+# Logging basique (console + fichier)
+logger = logging.getLogger("vultr-latency")
+if not logger.handlers:
+    logger.setLevel(logging.INFO)
+    _formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+    _console = logging.StreamHandler()
+    _console.setLevel(logging.INFO)
+    _console.setFormatter(_formatter)
+    _file = RotatingFileHandler("latency-multi-geo.log", maxBytes=1_000_000, backupCount=3)
+    _file.setLevel(logging.INFO)
+    _file.setFormatter(_formatter)
+    logger.addHandler(_console)
+    logger.addHandler(_file)
+
+# Flux WebSocket de marché par exchange : URL, messages d'abonnement envoyés après le handshake
+# et chemin de l'heure d'événement (ms, µs ou ISO) dans les messages de données
+WS_FEEDS = {
+    "binance": {"url": "wss://stream.binance.com:9443/ws/btcusdt@trade", "subscribe": [], "time": ["E"]},
+    "okx": {"url": "wss://ws.okx.com:8443/ws/v5/public",
+            "subscribe": [{"op": "subscribe", "args": [{"channel": "trades", "instId": "BTC-USDT"}]}],
+            "time": ["data", 0, "ts"]},
+    "bitflyer": {"url": "wss://ws.lightstream.bitflyer.com/json-rpc",
+                 "subscribe": [{"method": "subscribe", "params": {"channel": "lightning_executions_BTC_JPY"}}],
+                 "time": ["params", "message", 0, "exec_date"]},
+    "gmo": {"url": "wss://api.coin.z.com/ws/public/v1",
+            "subscribe": [{"command": "subscribe", "channel": "trades", "symbol": "BTC"}],
+            "time": ["timestamp"]},
+    "bybit": {"url": "wss://stream.bybit.com/v5/public/spot",
+              "subscribe": [{"op": "subscribe", "args": ["publicTrade.BTCUSDT"]}],
+              "time": ["ts"]},
+    "kraken": {"url": "wss://ws.kraken.com/v2",
+               "subscribe": [{"method": "subscribe", "params": {"channel": "trade", "symbol": ["BTC/USD"]}}],
+               "time": ["data", 0, "timestamp"]},
+    "bitstamp": {"url": "wss://ws.bitstamp.net",
+                 "subscribe": [{"event": "bts:subscribe", "data": {"channel": "live_trades_btcusd"}}],
+                 "time": ["data", "microtimestamp"]},
+    "coinbase": {"url": "wss://ws-feed.exchange.coinbase.com",
+                 "subscribe": [{"type": "subscribe", "product_ids": ["BTC-USD"], "channels": ["ticker"]}],
+                 "time": ["time"]},
+    "upbit": {"url": "wss://api.upbit.com/websocket/v1",
+              "subscribe": [[{"ticket": "latency-multi-geo"}, {"type": "trade", "codes": ["KRW-BTC"]}]],
+              "time": ["timestamp"]},
+}
+
+# Mapping Région -> Exchanges
+REGION_EXCHANGE_MAP = {
+    "nrt": {  # Tokyo
+        "name": "Tokyo",
+        "cex": {
+            "binance": "https://api.binance.com/api/v3/ping",
+            "okx": "https://www.okx.com/api/v5/public/time",
+            "bitflyer": "https://api.bitflyer.com/v1/getmarkets",
+            "gmo": "https://api.coin.z.com/public/v1/status"
+        },
+        "dex": {
+            "sushiswap": "https://api.sushi.com/",
+            "uniswap": "https://api.thegraph.com/subgraphs/name/uniswap/uniswap-v3"
+        },
+        "ws": {name: WS_FEEDS[name] for name in ("binance", "okx", "bitflyer", "gmo")}
+    },
+    "sgp": {  # Singapore
+        "name": "Singapore", 
+        "cex": {
+            "bybit": "https://api.bybit.com/v5/market/time",
+            "kucoin": "https://api.kucoin.com/api/v1/timestamp",
+            "crypto.com": "https://api.crypto.com/v2/public/get-ticker",
+            "huobi": "https://api.huobi.pro/v1/common/timestamp"
+        },
+        "dex": {
+            "pancakeswap": "https://api.thegraph.com/subgraphs/name/pancakeswap/exchange",
+            "dydx": "https://api.dydx.exchange/v3/candles/BTC-USD"
+        },
+        "ws": {name: WS_FEEDS[name] for name in ("bybit",)}
+    },
+    "fra": {  # Frankfurt
+        "name": "Frankfurt",
+        "cex": {
+            "kraken": "https://api.kraken.com/0/public/Time",
+            "bitstamp": "https://www.bitstamp.net/api/v2/ticker/btcusd/",
+            "bitfinex": "https://api-pub.bitfinex.com/v2/platform/status"
+        },
+        "dex": {
+            "uniswap": "https://api.thegraph.com/subgraphs/name/uniswap/uniswap-v3",
+            "curve": "https://api.curve.fi/api/getPools"
+        },
+        "ws": {name: WS_FEEDS[name] for name in ("kraken", "bitstamp")}
+    },
+    "ewr": {  # New York
+        "name": "New York",
+        "cex": {
+            "coinbase": "https://api.coinbase.com/v2/time",
+            "gemini": "https://api.gemini.com/v1/pubticker/btcusd",
+            "kraken": "https://api.kraken.com/0/public/Time"
+        },
+        "dex": {
+            "uniswap": "https://api.thegraph.com/subgraphs/name/uniswap/uniswap-v3"
+        },
+        "ws": {name: WS_FEEDS[name] for name in ("coinbase", "kraken")}
+    },
+    "icn": {  # Seoul
+        "name": "Seoul",
+        "cex": {
+            "upbit": "https://api.upbit.com/v1/ticker?markets=KRW-BTC",
+            "bithumb": "https://api.bithumb.com/public/ticker/BTC_KRW",
+            "korbit": "https://api.korbit.co.kr/v1/ticker?currency_pair=btc_krw"
+        },
+        "dex": {
+            "klayswap": "https://s.klayswap.com/stat/klayswapInfo.json"
+        },
+        "ws": {name: WS_FEEDS[name] for name in ("upbit",)}
+    }
+}
+
+# Endpoints d'heure serveur (ms) des exchanges dont l'URL mesurée ne renvoie pas l'heure à la milliseconde ;
+# les autres (bybit, okx, kucoin, huobi, gmo) la donnent déjà dans leur réponse
+SERVER_TIME_URLS = {
+    "binance": "https://api.binance.com/api/v3/time",
+    "coinbase": "https://api.exchange.coinbase.com/time",
+}
+
+# Configuration Vultr 
+# Profil de démarrage : "full" (apt + pip, sonde aiohttp) ou "fast" (aucun paquet, sonde stdlib)
+BOOT_PROFILE = os.getenv("BOOT_PROFILE", "full").strip().lower()
+# Fichier écrit par cloud-init en fin de startup script (instance prête à mesurer)
+PROBE_READY_MARKER = "/root/.probe-ready"
+VULTR_PLAN_ID = "vc2-1c-2gb"  # $12/month plan (upgradeable)
+VULTR_OS_ID = 1743  # Ubuntu 22.04 LTS
+VULTR_HOURLY_PRICE = 0.018  # $/heure par instance (estimation des coûts)
+
+# Sonde exécutée sur chaque instance (/root/latency_test.py).
+# - sans argument : une mesure depuis /root/endpoints.json, JSON sur stdout
+# - --agent [interval] : lit les endpoints une fois (1re ligne de stdin) puis
+#   publie un résultat JSON par ligne jusqu'à la fermeture de stdin
+REMOTE_PROBE_SCRIPT = r"""import asyncio
+import ipaddress
+import random
+import socket
+import struct
+import time
+import json
+import ssl
+import sys
+import threading
+
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+
+# Profil fast-boot : aucun paquet installé, la sonde se rabat sur la bibliothèque standard
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+DEFAULTS = {'samples': 10, 'interval': 0.1, 'max_inflight': 16, 'host_rate': 10.0, 'fresh_connections': False,
+            'methods': ['http'], 'ping_samples': 50, 'ping_interval': 0.02, 'ping_host_rate': 100.0,
+            'edges': False, 'dns_ttl': 300, 'sample_counts': {}, 'clock_endpoints': {},
+            'ws_endpoints': {}, 'ws_duration': 10.0, 'ws_ping_interval': 1.0}
+PHASES = ('dns', 'connect', 'tls', 'ttfb', 'body')
+# Horodatages par échantillon : envoi de la requête / réception des en-têtes (perf_counter et epoch s),
+# heure serveur (epoch ms) lue dans la réponse
+CLOCK_FIELDS = ('mono_sent', 'mono_recv', 'wall_sent', 'wall_recv', 'server_time')
+# Emplacements connus de l'heure serveur dans les réponses JSON (binance, bybit, kucoin/huobi, okx, coinbase, gmo)
+SERVER_TIME_PATHS = (('serverTime',), ('result', 'timeNano'), ('time',), ('data',), ('data', 0, 'ts'),
+                     ('epoch',), ('responsetime',))
+
+def load_config(payload):
+    # Ancien format : {name: url} ; nouveau : {'endpoints': {...}, 'samples': ..., ...}
+    if 'endpoints' not in payload:
+        payload = {'endpoints': payload}
+    config = dict(DEFAULTS)
+    config.update({k: v for k, v in payload.items() if v is not None})
+    return config
+
+def phase_durations(marks, end):
+    # Horodatages perf_counter -> durées (ms) par phase ; None si la phase n'a pas eu lieu
+    def span(a, b):
+        return round((marks[b] - marks[a]) * 1000, 3) if a in marks and b in marks else None
+    dns = span('dns_start', 'dns_end')
+    connect = span('connect_start', 'connect_end')
+    if connect is not None and dns is not None and 'tcp_start' not in marks:
+        # aiohttp : la création de connexion inclut la résolution DNS
+        connect = round(connect - dns, 3)
+    if 'tcp_start' in marks:
+        connect = span('tcp_start', 'tcp_end')
+    sent = 'sent' if 'sent' in marks else ('connect_end' if 'connect_end' in marks else 'start')
+    marks['end'] = end
+    return {
+        'dns': dns,
+        'connect': connect,
+        'tls': span('tls_start', 'tls_end'),
+        'ttfb': span(sent, 'headers'),
+        'body': span('headers', 'end'),
+        'cold': 'connect_start' in marks or 'tcp_start' in marks,
+    }
+
+def phase_trace_config():
+    # Hooks aiohttp : chaque évènement horodate le dict passé en trace_request_ctx
+    trace = aiohttp.TraceConfig()
+
+    def mark(name):
+        async def hook(session, ctx, params):
+            # Handshakes WebSocket : pas de dict de marques (ws_connect n'a pas de trace_request_ctx)
+            if ctx.trace_request_ctx is not None:
+                ctx.trace_request_ctx[name] = time.perf_counter()
+        return hook
+
+    trace.on_request_start.append(mark('start'))
+    trace.on_dns_resolvehost_start.append(mark('dns_start'))
+    trace.on_dns_resolvehost_end.append(mark('dns_end'))
+    trace.on_connection_create_start.append(mark('connect_start'))
+    trace.on_connection_create_end.append(mark('connect_end'))
+    trace.on_request_headers_sent.append(mark('sent'))
+    trace.on_request_end.append(mark('headers'))
+    return trace
+
+def timestamp_ms(value):
+    # Horodatage -> ms epoch ; None si la résolution est la seconde (inutilisable pour un décalage en ms)
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, str):
+        try:
+            value = float(value)
+        except ValueError:
+            if '.' not in value:
+                return None
+            # fromisoformat (Python 3.10) n'accepte que 3 ou 6 décimales : ramenées à 6
+            head, _, rest = value.partition('.')
+            digits = len(rest) - len(rest.lstrip('0123456789'))
+            value = f"{head}.{rest[:digits][:6].ljust(6, '0')}{rest[digits:]}"
+            try:
+                parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+            except ValueError:
+                return None
+            if parsed.tzinfo is None:
+                parsed = parsed.replace(tzinfo=timezone.utc)
+            return parsed.timestamp() * 1000
+    if not isinstance(value, (int, float)):
+        return None
+    for threshold, factor in ((1e17, 1e-6), (1e14, 1e-3), (1e11, 1.0)):
+        if value >= threshold:
+            return value * factor
+    if isinstance(value, float) and value != int(value) and value > 1e8:
+        return value * 1000
+    return None
+
+def json_path(payload, path):
+    for step in path:
+        try:
+            payload = payload[step]
+        except (KeyError, IndexError, TypeError):
+            return None
+    return payload
+
+def parse_server_time(body, paths=SERVER_TIME_PATHS):
+    # Heure serveur (ms epoch) d'une réponse JSON, à moins d'un jour de l'horloge locale, sinon None
+    if not body or len(body) > 65536:
+        return None
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return None
+    now_ms = time.time() * 1000
+    for path in paths:
+        ms = timestamp_ms(json_path(payload, path))
+        if ms is not None and abs(ms - now_ms) < 86400000:
+            return round(ms, 3)
+    return None
+
+def clock_marks(marks, wall, body):
+    # Envoi = en-têtes de requête partis, réception = en-têtes de réponse reçus (l'heure serveur est prise entre les deux)
+    sent = marks.get('sent', marks['start'])
+    received = marks.get('headers', marks['end'])
+    return {
+        'mono_sent': round(sent, 6),
+        'mono_recv': round(received, 6),
+        'wall_sent': round(wall + sent - marks['start'], 6),
+        'wall_recv': round(wall + received - marks['start'], 6),
+        'server_time': parse_server_time(body),
+    }
+
+class HostRateLimiter:
+    # Réserve un créneau par hôte : au plus `rate` requêtes/s vers un même hôte
+    def __init__(self, rate):
+        self.gap = 1.0 / rate if rate and rate > 0 else 0.0
+        self.next_slot = {}
+
+    async def wait(self, host):
+        now = time.monotonic()
+        slot = max(now, self.next_slot.get(host, 0.0))
+        self.next_slot[host] = slot + self.gap
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+class StdlibSession:
+    # Client HTTP/1.1 minimal (asyncio + ssl, keep-alive) utilisé quand aiohttp est absent
+    def __init__(self, fresh_connections=False):
+        self.idle = {}
+        self.fresh_connections = fresh_connections
+        self.ssl_context = ssl.create_default_context()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        for connections in self.idle.values():
+            for _, writer in connections:
+                writer.close()
+        self.idle.clear()
+
+    async def _read_body(self, reader, headers):
+        # Renvoie (connexion réutilisable, corps)
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b';')[0].strip() or b'0', 16)
+                if size == 0:
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    return True, b''.join(chunks)
+                chunks.append((await reader.readexactly(size + 2))[:-2])
+        if 'content-length' in headers:
+            return True, await reader.readexactly(int(headers['content-length']))
+        return False, await reader.read()
+
+    async def _connect(self, host, port, secure, marks, edge=None):
+        # DNS, TCP puis TLS séparément pour pouvoir chronométrer chaque phase
+        loop = asyncio.get_running_loop()
+        if edge is None:
+            marks['dns_start'] = time.perf_counter()
+            family, kind, proto, _, address = (await loop.getaddrinfo(host, port, type=socket.SOCK_STREAM))[0]
+            marks['dns_end'] = time.perf_counter()
+        else:
+            # Adresse imposée (edge) : pas de résolution, SNI et Host restent ceux de l'URL
+            family, kind, proto, _, address = edge_target(edge, port)
+        marks['tcp_start'] = time.perf_counter()
+        sock = socket.socket(family, kind, proto)
+        sock.setblocking(False)
+        try:
+            await loop.sock_connect(sock, address)
+        except BaseException:
+            sock.close()
+            raise
+        marks['tcp_end'] = marks['tls_start'] = time.perf_counter()
+        reader, writer = await asyncio.open_connection(
+            sock=sock, ssl=self.ssl_context if secure else None, server_hostname=host if secure else None)
+        if secure:
+            marks['tls_end'] = time.perf_counter()
+        else:
+            del marks['tls_start']
+        return reader, writer
+
+    async def _exchange(self, reader, writer, parts, marks):
+        target = (parts.path or '/') + ('?' + parts.query if parts.query else '')
+        writer.write((f"GET {target} HTTP/1.1\r\nHost: {parts.netloc}\r\n"
+                      "User-Agent: latency-probe\r\nAccept: */*\r\n\r\n").encode())
+        await writer.drain()
+        marks['sent'] = time.perf_counter()
+        status = await reader.readline()
+        if not status:
+            raise ConnectionError('connexion fermée par le serveur')
+        marks['headers'] = time.perf_counter()
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        reusable, body = await self._read_body(reader, headers)
+        return int(status.split()[1]), reusable and headers.get('connection', '').lower() != 'close', body
+
+    async def get(self, url, marks=None, edge=None):
+        marks = {} if marks is None else marks
+        parts = urlparse(url)
+        secure = parts.scheme == 'https'
+        port = parts.port or (443 if secure else 80)
+        pool = self.idle.setdefault((parts.hostname, port, secure, edge), [])
+        # Une connexion inactive peut avoir été fermée par le serveur : un seul nouvel essai
+        for pooled in (True, False):
+            if pooled and (not pool or self.fresh_connections):
+                continue
+            if pooled:
+                reader, writer = pool.pop()
+            else:
+                reader, writer = await self._connect(parts.hostname, port, secure, marks, edge)
+            try:
+                status, reusable, body = await self._exchange(reader, writer, parts, marks)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                writer.close()
+                if pooled:
+                    continue
+                raise
+            except BaseException:
+                writer.close()
+                raise
+            if reusable and not self.fresh_connections:
+                pool.append((reader, writer))
+            else:
+                writer.close()
+            return status, body
+
+async def test_latency(url, session, edge=None):
+    # Renvoie (latence totale ms, phases) ou (-1, None) en cas d'échec
+    marks = {}
+    try:
+        wall = time.time()
+        start = marks['start'] = time.perf_counter()
+        if isinstance(session, StdlibSession):
+            _, body = await asyncio.wait_for(session.get(url, marks, edge), 5)
+        else:
+            async with session.get(url, timeout=5, trace_request_ctx=marks) as response:
+                body = await response.read()
+        end = time.perf_counter()
+        phases = phase_durations(marks, end)
+        phases.update(clock_marks(marks, wall, body))
+        return (end - start) * 1000, phases
+    except:
+        return -1, None
+
+async def ping_latency(url, tls, addresses, edge=None):
+    # Handshake seul : connexion TCP (SYN -> SYN/ACK) ou, si tls, connexion TCP + handshake TLS
+    parts = urlparse(url)
+    port = parts.port or (443 if parts.scheme == 'https' else 80)
+    loop = asyncio.get_running_loop()
+    try:
+        if edge is not None:
+            family, kind, proto, _, address = edge_target(edge, port)
+        else:
+            if (parts.hostname, port) not in addresses:
+                addresses[parts.hostname, port] = (
+                    await loop.getaddrinfo(parts.hostname, port, type=socket.SOCK_STREAM))[0]
+            family, kind, proto, _, address = addresses[parts.hostname, port]
+    except:
+        return -1, None
+    sock = socket.socket(family, kind, proto)
+    sock.setblocking(False)
+    writer = None
+    try:
+        start = time.perf_counter()
+        await asyncio.wait_for(loop.sock_connect(sock, address), 3)
+        connected = time.perf_counter()
+        if not tls:
+            # RST à la fermeture : pas de TIME_WAIT accumulés à haute fréquence
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+            return (connected - start) * 1000, {}
+        _, writer = await asyncio.wait_for(
+            asyncio.open_connection(sock=sock, ssl=TLS_CONTEXT, server_hostname=parts.hostname), 3)
+        return (time.perf_counter() - start) * 1000, {}
+    except:
+        return -1, None
+    finally:
+        if writer is not None:
+            writer.close()
+        else:
+            sock.close()
+
+TLS_CONTEXT = ssl.create_default_context()
+
+def edge_target(edge, port):
+    # Entrée façon getaddrinfo pour une adresse IP imposée
+    if ':' in edge:
+        return socket.AF_INET6, socket.SOCK_STREAM, 0, '', (edge, port, 0, 0)
+    return socket.AF_INET, socket.SOCK_STREAM, 0, '', (edge, port)
+
+def dns_nameserver():
+    try:
+        with open('/etc/resolv.conf') as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) >= 2 and fields[0] == 'nameserver':
+                    return fields[1]
+    except OSError:
+        pass
+    return None
+
+def dns_skip_name(data, offset):
+    # Saute un nom DNS (labels ou pointeur de compression)
+    while True:
+        length = data[offset]
+        if length == 0:
+            return offset + 1
+        if length & 0xC0 == 0xC0:
+            return offset + 2
+        offset += length + 1
+
+def dns_query(nameserver, host, qtype):
+    # Requête UDP minimale (RD=1) : [(ip, ttl)] des enregistrements A (1) ou AAAA (28), CNAME suivis par le résolveur
+    ident = random.getrandbits(16)
+    question = b''.join(bytes([len(label)]) + label.encode('idna') for label in host.rstrip('.').split('.'))
+    packet = struct.pack('!HHHHHH', ident, 0x0100, 1, 0, 0, 0) + question + bytes(1) + struct.pack('!HH', qtype, 1)
+    family = socket.AF_INET6 if ':' in nameserver else socket.AF_INET
+    with socket.socket(family, socket.SOCK_DGRAM) as sock:
+        sock.settimeout(2)
+        sock.sendto(packet, (nameserver, 53))
+        data = sock.recv(4096)
+    answer_id, flags, questions, answers, _, _ = struct.unpack('!HHHHHH', data[:12])
+    if answer_id != ident or flags & 0x000F:
+        raise ValueError(f'réponse DNS invalide (rcode={flags & 0x000F})')
+    offset = 12
+    for _ in range(questions):
+        offset = dns_skip_name(data, offset) + 4
+    records = []
+    for _ in range(answers):
+        offset = dns_skip_name(data, offset)
+        rtype, _, ttl, length = struct.unpack('!HHIH', data[offset:offset + 10])
+        offset += 10
+        if rtype == qtype:
+            family = socket.AF_INET if qtype == 1 else socket.AF_INET6
+            records.append((socket.inet_ntop(family, data[offset:offset + length]), ttl))
+        offset += length
+    return records
+
+def lookup_edges(host, port, max_ttl):
+    # Toutes les adresses IPv4/IPv6 d'un hôte et leur TTL ; repli sur getaddrinfo (TTL = max_ttl)
+    try:
+        return [str(ipaddress.ip_address(host))], max_ttl
+    except ValueError:
+        pass
+    nameserver = dns_nameserver()
+    records = []
+    if nameserver:
+        for qtype in (1, 28):
+            try:
+                records += dns_query(nameserver, host, qtype)
+            except (OSError, ValueError, struct.error, IndexError):
+                pass
+    if records:
+        edges = list(dict.fromkeys(ip for ip, _ in records))
+        return edges, min(max_ttl, min(ttl for _, ttl in records))
+    infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    return list(dict.fromkeys(info[4][0] for info in infos)), max_ttl
+
+class EdgeResolver:
+    # Cache des edges par hôte, conservé entre les mesures du mode agent et expiré selon le TTL DNS
+    def __init__(self):
+        self.cache = {}
+
+    async def resolve(self, url, max_ttl):
+        parts = urlparse(url)
+        host = parts.hostname
+        now = time.monotonic()
+        cached = self.cache.get(host)
+        if cached and cached[0] > now:
+            return cached[1]
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        loop = asyncio.get_running_loop()
+        try:
+            edges, ttl = await loop.run_in_executor(None, lookup_edges, host, port, float(max_ttl))
+        except OSError:
+            # Résolution impossible : on garde les edges périmés plutôt que rien
+            return cached[1] if cached else []
+        self.cache[host] = (now + max(ttl, 1.0), edges)
+        return edges
+
+EDGE_RESOLVER = EdgeResolver()
+# Pseudo-edge : adresse choisie par le résolveur, mesurée avec le client des edges
+RESOLVER_EDGE = 'resolver'
+
+async def run_round(config, session, edge_session=None):
+    urls = config['endpoints']
+    inflight = asyncio.Semaphore(max(1, int(config['max_inflight'])))
+    limiters = {'http': HostRateLimiter(float(config['host_rate'])),
+                'ping': HostRateLimiter(float(config['ping_host_rate']))}
+    addresses = {}
+
+    # Edges : chaque adresse A/AAAA de l'hôte est mesurée à part, en plus de l'adresse choisie par le résolveur
+    edges = {}
+    if config['edges']:
+        resolved = await asyncio.gather(*(EDGE_RESOLVER.resolve(url, config['dns_ttl']) for url in urls.values()))
+        edges = dict(zip(urls, resolved))
+
+    # Une tâche de mesure par (endpoint, méthode, edge) : http = GET complet, tcp/tls = handshake seul,
+    # clock = GET d'un endpoint d'heure serveur (exchanges dont l'URL mesurée ne la renvoie pas) ;
+    # sample_counts fixe le volume par clé (échantillonnage adaptatif, 0 = paire déjà convergée)
+    jobs = []
+    methods = [method for method in config['methods'] if method != 'ws']
+    if config['clock_endpoints'] and 'http' in methods:
+        methods.append('clock')
+    for method in methods:
+        is_http = method in ('http', 'clock')
+        count = int(config['samples'] if is_http else config['ping_samples'])
+        spacing = float(config['interval'] if is_http else config['ping_interval'])
+        targets = config['clock_endpoints'] if method == 'clock' else urls
+        for name, url in targets.items():
+            key = name if method == 'http' else f'{name}@{method}'
+            pinned = edges.get(name, []) if method != 'clock' else []
+            # clock suit le volume http de l'exchange (plus rien une fois la paire convergée)
+            default = config['sample_counts'].get(name, count) if method == 'clock' else count
+            # Edges http mesurés avec le client stdlib : l'adresse du résolveur l'est aussi (#resolver),
+            # pour comparer les edges à une référence prise avec le même client
+            baseline = [(f'{key}#{RESOLVER_EDGE}', RESOLVER_EDGE)] if pinned and method == 'http' else []
+            for job_key, edge in [(key, None)] + baseline + [(f'{key}#{edge}', edge) for edge in pinned]:
+                job_count = int(config['sample_counts'].get(job_key, default))
+                if job_count > 0:
+                    jobs.append((job_key, name, method, url, job_count, spacing, edge))
+    samples = {key: [None] * count for key, _, _, _, count, _, _ in jobs}
+
+    async def probe(key, method, url, edge, index):
+        # Limite par nom d'hôte : les edges d'un même hôte partagent son quota ; clock est un GET complet (quota http)
+        await limiters['ping' if method in ('tcp', 'tls') else 'http'].wait(urlparse(url).hostname)
+        async with inflight:
+            if method in ('http', 'clock'):
+                pinned = edge is not None and edge_session is not None
+                target = None if edge == RESOLVER_EDGE else edge
+                samples[key][index] = await test_latency(url, edge_session if pinned else session, target)
+            else:
+                samples[key][index] = await ping_latency(url, method == 'tls', addresses, edge)
+
+    # Vagues entrelacées : l'échantillon i de chaque endpoint part au même instant
+    schedule = sorted((index * spacing, position, index)
+                      for position, (_, _, _, _, count, spacing, _) in enumerate(jobs) for index in range(count))
+    loop = asyncio.get_running_loop()
+    t0 = loop.time()
+    started_at = time.time()
+    # Flux WebSocket : une connexion maintenue par exchange, en parallèle des vagues de requêtes
+    feeds = config['ws_endpoints'] if 'ws' in config['methods'] else {}
+    ws_tasks = {name: asyncio.create_task(ws_probe(feed, config, session)) for name, feed in feeds.items()}
+    tasks = []
+    for offset, position, index in schedule:
+        delay = t0 + offset - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        key, _, method, url, _, _, edge = jobs[position]
+        tasks.append(asyncio.create_task(probe(key, method, url, edge, index)))
+    await asyncio.gather(*tasks)
+
+    # Tous les échantillons sont renvoyés ; les échecs sont comptés, pas ignorés
+    results = {}
+    for key, name, method, _, _, _, edge in jobs:
+        values = samples[key]
+        done = [value for value in values if value is not None]
+        ok = [(lat, phases) for lat, phases in done if lat > 0]
+        latencies = [lat for lat, _ in ok]
+        entry = {
+            'exchange': name,
+            'method': method,
+            'edge': edge,
+            'started_at': started_at,
+            'samples': [round(lat, 3) for lat in latencies],
+            'errors': len(done) - len(ok),
+            # Phases et horodatages alignés sur 'samples' (listes parallèles), requêtes HTTP uniquement
+            'phases': {phase: [phases.get(phase) for _, phases in ok] for phase in PHASES + ('cold',) + CLOCK_FIELDS}
+                      if method in ('http', 'clock') else {},
+        }
+        if latencies:
+            entry.update({
+                'min': min(latencies),
+                'avg': sum(latencies)/len(latencies),
+                'max': max(latencies)
+            })
+        results[key] = entry
+    for name, task in ws_tasks.items():
+        # Échantillons = fraîcheur des messages (> 0 : une valeur négative trahit un décalage d'horloge) ;
+        # les valeurs écartées sont comptées pour que le décalage reste visible dans le rapport
+        staleness, errors, phases = await task
+        latencies = [value for value in staleness if value > 0]
+        phases['ws_skewed'] = len(staleness) - len(latencies)
+        entry = {
+            'exchange': name,
+            'method': 'ws',
+            'edge': None,
+            'started_at': started_at,
+            'samples': latencies,
+            'errors': errors,
+            'phases': phases,
+        }
+        if latencies:
+            entry.update({'min': min(latencies), 'avg': sum(latencies)/len(latencies), 'max': max(latencies)})
+        results[f'{name}@ws'] = entry
+    return results
+
+async def ws_probe(feed, config, session):
+    # Connexion WebSocket maintenue ws_duration s : handshake, premier message daté après abonnement,
+    # RTT ping/pong, inter-arrivées et fraîcheur (réception locale - heure d'événement de l'exchange).
+    # Renvoie (fraîcheurs en ms, erreurs, phases)
+    phases = {'ws_handshake': [], 'ws_first': [], 'ws_ping': [], 'ws_gap': []}
+    staleness = []
+    if aiohttp is None:
+        # Profil fast-boot : pas de client WebSocket dans la bibliothèque standard
+        return staleness, 1, phases
+    try:
+        start = time.perf_counter()
+        ws = await asyncio.wait_for(session.ws_connect(feed['url'], autoping=False, max_msg_size=0), 10)
+    except Exception:
+        return staleness, 1, phases
+    try:
+        phases['ws_handshake'].append(round((time.perf_counter() - start) * 1000, 3))
+        for message in feed.get('subscribe') or []:
+            await ws.send_str(json.dumps(message))
+        subscribed = time.perf_counter()
+        deadline = subscribed + float(config['ws_duration'])
+        interval = float(config['ws_ping_interval'])
+        next_ping = subscribed + interval
+        pings = {}
+        last = None
+        while True:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            if now >= next_ping:
+                payload = str(len(pings)).encode()
+                pings[payload] = now
+                await ws.ping(payload)
+                next_ping = now + interval
+            try:
+                msg = await ws.receive(timeout=max(0.001, min(deadline, next_ping) - time.perf_counter()))
+            except asyncio.TimeoutError:
+                continue
+            received, wall = time.perf_counter(), time.time()
+            if msg.type == aiohttp.WSMsgType.PING:
+                await ws.pong(msg.data)
+                continue
+            if msg.type == aiohttp.WSMsgType.PONG:
+                sent = pings.get(bytes(msg.data))
+                if sent is not None:
+                    phases['ws_ping'].append(round((received - sent) * 1000, 3))
+                continue
+            if msg.type not in (aiohttp.WSMsgType.TEXT, aiohttp.WSMsgType.BINARY):
+                break
+            # Acquittements et heartbeats sans heure d'événement ignorés
+            event = parse_server_time(msg.data, (feed['time'],))
+            if event is None:
+                continue
+            if last is None:
+                phases['ws_first'].append(round((received - subscribed) * 1000, 3))
+            else:
+                phases['ws_gap'].append(round((received - last) * 1000, 3))
+            last = received
+            staleness.append(round(wall * 1000 - event, 3))
+        # Flux muet pendant toute la durée : compté comme un échec
+        return staleness, 0 if last is not None else 1, phases
+    except Exception:
+        return staleness, 1, phases
+    finally:
+        await ws.close()
+
+def make_session(config):
+    fresh = bool(config['fresh_connections'])
+    if aiohttp is None:
+        return StdlibSession(fresh_connections=fresh)
+    # fresh_connections : une connexion neuve par requête (mesures "à froid" uniquement)
+    connector = aiohttp.TCPConnector(limit=max(1, int(config['max_inflight'])), force_close=fresh)
+    return aiohttp.ClientSession(connector=connector, trace_configs=[phase_trace_config()])
+
+def make_edge_session(config):
+    # Requêtes vers une adresse imposée : client stdlib (aiohttp ne permet pas de fixer l'IP par requête)
+    return StdlibSession(fresh_connections=bool(config['fresh_connections']))
+
+async def main():
+    config = load_config(json.loads(open('/root/endpoints.json').read()))
+    async with make_session(config) as session, make_edge_session(config) as edge_session:
+        results = await run_round(config, session, edge_session)
+        print(json.dumps(results, indent=2))
+
+async def agent(interval):
+    loop = asyncio.get_running_loop()
+    line = await loop.run_in_executor(None, sys.stdin.readline)
+    if not line.strip():
+        return
+    config = load_config(json.loads(line))
+    stop = asyncio.Event()
+
+    def watch_stdin():
+        # Lignes suivantes : nouveaux volumes par clé (échantillonnage adaptatif), appliqués à la mesure suivante ;
+        # EOF sur stdin (session SSH fermée) = arrêt demandé
+        for update in iter(sys.stdin.readline, ''):
+            try:
+                counts = json.loads(update)['sample_counts']
+            except (ValueError, KeyError, TypeError):
+                continue
+            loop.call_soon_threadsafe(config.update, {'sample_counts': counts})
+        loop.call_soon_threadsafe(stop.set)
+
+    threading.Thread(target=watch_stdin, daemon=True).start()
+    async with make_session(config) as session, make_edge_session(config) as edge_session:
+        while not stop.is_set():
+            started = time.time()
+            results = await run_round(config, session, edge_session)
+            sys.stdout.write(json.dumps({'ts': started, 'results': results}) + '\n')
+            sys.stdout.flush()
+            try:
+                await asyncio.wait_for(stop.wait(), max(0.0, interval - (time.time() - started)))
+            except asyncio.TimeoutError:
+                pass
+
+if len(sys.argv) > 1 and sys.argv[1] == '--agent':
+    asyncio.run(agent(float(sys.argv[2]) if len(sys.argv) > 2 else 5.0))
+else:
+    asyncio.run(main())
+"""
+
+PROBE_SCRIPT_HASH = hashlib.sha256(REMOTE_PROBE_SCRIPT.encode("utf-8")).hexdigest()[:16]
+
+
+# Seuils de couleur des latences (ms) : vert < 75, orange <= 200, rouge au-delà
+LATENCY_GREEN_MS = 75
+LATENCY_ORANGE_MS = 200
+# Nombre d'échantillons récents conservés par clé (sparklines du tableau live)
+RECENT_SAMPLES = 16
+# Précision relative des buckets de l'histogramme de latence (0.01 = 1 %)
+HISTOGRAM_PRECISION = 0.01
+# Colonnes de statistiques par (région, exchange)
+STAT_COLUMNS = ['p50 (ms)', 'p90 (ms)', 'p99 (ms)', 'Stddev (ms)', 'Jitter (ms)', 'Error rate (%)']
+# Phases de requête suivies par clé : TTFB à chaud (connexion keep-alive), total à froid
+# (nouvelle connexion) et durée médiane de chaque phase
+PHASE_COLUMNS = {
+    'warm_ttfb': ['Warm TTFB p50 (ms)', 'Warm TTFB p99 (ms)'],
+    'cold_total': ['Cold p50 (ms)'],
+    'dns': ['DNS p50 (ms)'],
+    'connect': ['Connect p50 (ms)'],
+    'tls': ['TLS p50 (ms)'],
+    'body': ['Body p50 (ms)'],
+    'ws_handshake': ['WS handshake p50 (ms)'],
+    'ws_first': ['WS first message p50 (ms)'],
+    'ws_ping': ['WS ping RTT p50 (ms)'],
+    'ws_gap': ['WS inter-arrival p50 (ms)'],
+}
+# Phases des flux WebSocket (listes indépendantes, non alignées sur les échantillons de fraîcheur)
+WS_PHASES = ('ws_handshake', 'ws_first', 'ws_ping', 'ws_gap')
+# Horloge serveur : décalage estimé (serveur - local, ± demi-RTT des meilleurs échantillons)
+# et latences aller simple (up = envoi d'ordre, down = réception de données)
+CLOCK_COLUMNS = ['Clock offset (ms)', 'Clock ± (ms)', 'One-way up p50 (ms)', 'One-way down p50 (ms)']
+# Échantillons au RTT minimal retenus pour l'estimation du décalage (filtre NTP)
+CLOCK_BEST_SAMPLES = 8
+
+
+def beta_cdf(x: float, a: float, b: float) -> float:
+    """Fonction bêta incomplète régularisée I_x(a, b) (fraction continue, méthode de Lentz)"""
+    if x <= 0.0:
+        return 0.0
+    if x >= 1.0:
+        return 1.0
+    if x > (a + 1) / (a + b + 2):
+        # Symétrie : la fraction converge vite de ce côté
+        return 1.0 - beta_cdf(1.0 - x, b, a)
+    front = math.exp(math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) + a * math.log(x) + b * math.log1p(-x))
+    tiny = 1e-300
+    c, d = 1.0, 1.0 - (a + b) * x / (a + 1)
+    d = 1.0 / (d if abs(d) > tiny else tiny)
+    result = d
+    for m in range(1, 300):
+        for numerator in (m * (b - m) * x / ((a + 2 * m - 1) * (a + 2 * m)),
+                          -(a + m) * (a + b + m) * x / ((a + 2 * m) * (a + 2 * m + 1))):
+            d = 1.0 + numerator * d
+            d = 1.0 / (d if abs(d) > tiny else tiny)
+            c = 1.0 + numerator / c
+            c = c if abs(c) > tiny else tiny
+            result *= c * d
+        if abs(c * d - 1.0) < 1e-12:
+            break
+    return front * result / a
+
+
+class LatencyHistogram:
+    """Histogramme log-bucketé (style HDR) : quantiles à ±precision près, fusionnable, taille O(buckets)"""
+
+    def __init__(self, precision: float = HISTOGRAM_PRECISION):
+        self.precision = precision
+        self._log_base = math.log1p(precision)
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def record(self, value: float, count: int = 1):
+        """Ajoute une mesure (ms, > 0)"""
+        if value <= 0 or count <= 0:
+            return
+        index = math.floor(math.log(value) / self._log_base)
+        self.counts[index] = self.counts.get(index, 0) + count
+        self.count += count
+        self.total += value * count
+        self.total_sq += value * value * count
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    @classmethod
+    def from_samples(cls, samples: List[float], precision: float = HISTOGRAM_PRECISION) -> "LatencyHistogram":
+        hist = cls(precision)
+        for value in samples:
+            hist.record(value)
+        return hist
+
+    def merge(self, other: "LatencyHistogram") -> "LatencyHistogram":
+        """Fusionne un autre histogramme (même précision) dans celui-ci"""
+        if other.precision != self.precision:
+            raise ValueError("Précisions d'histogramme différentes")
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        self.total_sq += other.total_sq
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def value_at_rank(self, rank: int) -> float:
+        """Valeur de la statistique d'ordre `rank` (1..count), au centre géométrique du bucket"""
+        if not self.count:
+            return math.nan
+        target = min(max(1, rank), self.count)
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                value = math.exp((index + 0.5) * self._log_base)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def quantile(self, q: float) -> float:
+        """Quantile q (0..1) estimé au centre géométrique du bucket"""
+        return self.value_at_rank(math.ceil(q * self.count))
+
+    def quantile_interval(self, q: float, z: float = 1.96) -> Tuple[float, float]:
+        """Intervalle de confiance du quantile q par statistiques d'ordre (approximation normale de la binomiale) ;
+        quand ces rangs sortent de l'échantillon (p99 avant ~660 mesures), quantile ± z x erreur type de
+        Maritz-Jarrett ; (nan, nan) sous 3 mesures"""
+        n = self.count
+        spread = z * math.sqrt(n * q * (1 - q))
+        low, high = math.floor(n * q - spread), math.ceil(n * q + spread) + 1
+        if 1 <= low and high <= n:
+            return self.value_at_rank(low), self.value_at_rank(high)
+        if n < 3:
+            return math.nan, math.nan
+        center, error = self.quantile(q), z * self.maritz_jarrett_se(q)
+        return center - error, center + error
+
+    def maritz_jarrett_se(self, q: float) -> float:
+        """Erreur type de Maritz-Jarrett du quantile q : statistiques d'ordre pondérées par la loi bêta
+        du rang m = qn (bucket par bucket, rangs bornés à 2..n-1)"""
+        n = self.count
+        m = min(max(int(q * n + 0.5), 2), n - 1)
+        first = second = previous = 0.0
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            cdf = beta_cdf(seen / n, m - 1, n - m)
+            value = min(max(math.exp((index + 0.5) * self._log_base), self.min), self.max)
+            first += (cdf - previous) * value
+            second += (cdf - previous) * value * value
+            previous = cdf
+        return math.sqrt(max(second - first * first, 0.0))
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else math.nan
+
+    @property
+    def stddev(self) -> float:
+        if self.count < 2:
+            return math.nan
+        variance = (self.total_sq - self.total * self.total / self.count) / (self.count - 1)
+        return math.sqrt(max(variance, 0.0))
+
+    def to_dict(self) -> Dict:
+        return {
+            'precision': self.precision, 'counts': {str(k): v for k, v in self.counts.items()},
+            'count': self.count, 'total': self.total, 'total_sq': self.total_sq,
+            'min': self.min if self.count else None, 'max': self.max if self.count else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "LatencyHistogram":
+        hist = cls(data.get('precision', HISTOGRAM_PRECISION))
+        hist.counts = {int(k): int(v) for k, v in data.get('counts', {}).items()}
+        hist.count = int(data.get('count', 0))
+        hist.total = float(data.get('total', 0.0))
+        hist.total_sq = float(data.get('total_sq', 0.0))
+        if hist.count:
+            hist.min, hist.max = float(data['min']), float(data['max'])
+        return hist
+
+
+def sample_jitter(samples: List[float]) -> float:
+    """Jitter : moyenne des écarts absolus entre échantillons consécutifs (à la RFC 3550)"""
+    if len(samples) < 2:
+        return math.nan
+    return sum(abs(b - a) for a, b in zip(samples, samples[1:])) / (len(samples) - 1)
+
+
+def sample_stats(samples: List[float], errors: int = 0) -> Dict:
+    """Percentiles exacts, écart-type, jitter et taux d'erreur d'un vecteur d'échantillons"""
+    attempts = len(samples) + errors
+    stats = dict.fromkeys(STAT_COLUMNS, math.nan)
+    stats['Error rate (%)'] = round(100.0 * errors / attempts, 2) if attempts else math.nan
+    if samples:
+        p50, p90, p99 = np.percentile(samples, [50, 90, 99])
+        stats.update({
+            'p50 (ms)': round(float(p50), 2),
+            'p90 (ms)': round(float(p90), 2),
+            'p99 (ms)': round(float(p99), 2),
+            'Stddev (ms)': round(float(np.std(samples, ddof=1)), 2) if len(samples) > 1 else math.nan,
+            'Jitter (ms)': round(sample_jitter(samples), 2) if len(samples) > 1 else math.nan,
+        })
+    return stats
+
+
+class RunningStats:
+    """Moyenne/variance en ligne (Welford), fusionnable (Chan et al.)"""
+
+    __slots__ = ('count', 'mean', 'm2', 'min', 'max')
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other: "RunningStats") -> "RunningStats":
+        if not other.count:
+            return self
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / total
+        self.m2 += other.m2 + delta * delta * self.count * other.count / total
+        self.count = total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    @property
+    def stddev(self) -> float:
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else math.nan
+
+
+class ClockEstimate:
+    """Décalage d'horloge serveur/local à la NTP et latences aller simple d'une clé.
+
+    Pour un échantillon envoyé à t0, reçu à t3 (horloge locale) et horodaté Ts par le serveur :
+    aller = Ts - t0, retour = t3 - Ts, décalage = Ts - (t0 + t3) / 2 à ± RTT / 2 près. Seuls les
+    CLOCK_BEST_SAMPLES échantillons au RTT le plus faible (les moins perturbés par les files d'attente)
+    servent au décalage, dont la médiane est retenue. Aller et retour supposent des horloges synchronisées
+    (NTP/chrony) : le décalage mesuré confond alors asymétrie du chemin et erreur d'horloge résiduelle."""
+
+    __slots__ = ('best', 'up', 'down', 'inconsistent')
+
+    def __init__(self):
+        self.best: List[Tuple[float, float]] = []  # tas (-rtt, décalage) : le pire RTT en tête
+        self.up = LatencyHistogram()
+        self.down = LatencyHistogram()
+        # Échantillons dont un sens est négatif (horloges décalées de plus que l'aller simple)
+        self.inconsistent = 0
+
+    def add(self, wall_sent: float, wall_recv: float, server_ms: float):
+        up = server_ms - wall_sent * 1000
+        down = wall_recv * 1000 - server_ms
+        item = (-(up + down), (up - down) / 2)
+        if len(self.best) < CLOCK_BEST_SAMPLES:
+            heapq.heappush(self.best, item)
+        elif item > self.best[0]:
+            heapq.heapreplace(self.best, item)
+        if up > 0 and down > 0:
+            self.up.record(up)
+            self.down.record(down)
+        else:
+            self.inconsistent += 1
+
+    @property
+    def offset(self) -> float:
+        return statistics.median(offset for _, offset in self.best) if self.best else math.nan
+
+    @property
+    def uncertainty(self) -> float:
+        return -self.best[0][0] / 2 if self.best else math.nan
+
+
+class AggregateEntry:
+    """État agrégé d'une clé (région, exchange, type, méthode, edge)"""
+
+    __slots__ = ('stats', 'histogram', 'errors', 'skewed', 'jitter_sum', 'jitter_weight', 'rounds', 'last_seen',
+                 'recent', 'phases', 'clock')
+
+    def __init__(self):
+        self.stats = RunningStats()
+        self.histogram = LatencyHistogram()
+        self.errors = 0
+        # Fraîcheurs WebSocket <= 0 écartées (horloge de l'instance en retard sur celle de l'exchange)
+        self.skewed = 0
+        self.jitter_sum = 0.0
+        self.jitter_weight = 0
+        self.rounds = 0
+        self.last_seen = None
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+        self.phases = {phase: LatencyHistogram() for phase in PHASE_COLUMNS}
+        self.clock = ClockEstimate()
+
+    def add_phases(self, samples: List[float], phases: Dict):
+        """Répartit les phases d'une mesure : TTFB des requêtes keep-alive, total des requêtes à froid"""
+        cold_flags = phases.get('cold') or []
+        ttfbs = phases.get('ttfb') or []
+        for index, total in enumerate(samples):
+            if index < len(cold_flags) and cold_flags[index]:
+                self.phases['cold_total'].record(total)
+            elif index < len(ttfbs) and ttfbs[index] is not None:
+                self.phases['warm_ttfb'].record(ttfbs[index])
+        for phase in ('dns', 'connect', 'tls', 'body') + WS_PHASES:
+            for value in phases.get(phase) or []:
+                if value is not None:
+                    self.phases[phase].record(value)
+        self.skewed += int(phases.get('ws_skewed') or 0)
+        for sent, received, server in zip(phases.get('wall_sent') or [], phases.get('wall_recv') or [],
+                                          phases.get('server_time') or []):
+            if None not in (sent, received, server):
+                self.clock.add(sent, received, server)
+
+
+class LatencyAggregator:
+    """Agrégation incrémentale des mesures (clé région, exchange, type, méthode, edge) : mémoire et rapport en O(clés)"""
+
+    KEY_COLUMNS = ('Region', 'Exchange', 'Type', 'Method', 'Edge IP')
+    # Valeurs des colonnes absentes des CSV antérieurs (mode ping, mesure par edge)
+    KEY_DEFAULTS = {'Method': 'http', 'Edge IP': ''}
+
+    def __init__(self):
+        self.entries: Dict[Tuple, AggregateEntry] = {}
+        self.rounds = 0
+
+    def add_rows(self, rows: List[Dict]):
+        """Intègre les lignes d'une mesure (format de LatencyTester._rows_from_results)"""
+        for row in rows:
+            key = tuple(self._key_value(row, column) for column in self.KEY_COLUMNS)
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = self.entries[key] = AggregateEntry()
+            # Liste (mesure en cours) ou tableau numpy (relu depuis le store)
+            samples = row.get('Samples')
+            samples = [] if samples is None else list(samples)
+            if not samples and not pd.isna(row.get('Latency (ms)')):
+                # Ancienne sonde : seule la moyenne de la mesure est connue
+                samples = [float(row['Latency (ms)'])]
+            for value in samples:
+                entry.stats.add(value)
+                entry.histogram.record(value)
+            entry.recent.extend(samples)
+            phases = row.get('Phases')
+            if isinstance(phases, str):
+                phases = json.loads(phases)
+            if phases:
+                entry.add_phases(samples, phases)
+            if len(samples) > 1:
+                entry.jitter_sum += sample_jitter(samples) * (len(samples) - 1)
+                entry.jitter_weight += len(samples) - 1
+            entry.errors += int(row.get('Errors', 0) or 0)
+            entry.rounds += 1
+            entry.last_seen = row.get('Timestamp')
+        self.rounds += 1
+
+    def _key_value(self, row: Dict, column: str):
+        value = row.get(column)
+        if column in self.KEY_DEFAULTS and (value is None or pd.isna(value)):
+            return self.KEY_DEFAULTS[column]
+        return row[column]
+
+    def add_frame(self, df: pd.DataFrame) -> "LatencyAggregator":
+        self.add_rows(df.to_dict('records'))
+        return self
+
+    def summary_frame(self) -> pd.DataFrame:
+        """Statistiques par clé, calculées depuis l'état agrégé"""
+        rows = []
+        for (region, exchange, kind, method, edge), entry in self.entries.items():
+            stats, hist = entry.stats, entry.histogram
+            attempts = stats.count + entry.errors
+            rows.append({
+                'Region': region,
+                'Exchange': exchange,
+                'Type': kind,
+                'Method': method,
+                'Edge IP': edge,
+                'Count': stats.count,
+                'Latency (ms)': round(stats.mean, 2) if stats.count else math.nan,
+                'p50 (ms)': round(hist.quantile(0.50), 2),
+                'p90 (ms)': round(hist.quantile(0.90), 2),
+                'p99 (ms)': round(hist.quantile(0.99), 2),
+                'Stddev (ms)': round(stats.stddev, 2),
+                'Jitter (ms)': round(entry.jitter_sum / entry.jitter_weight, 2) if entry.jitter_weight else math.nan,
+                'Error rate (%)': round(100.0 * entry.errors / attempts, 2) if attempts else math.nan,
+                'Skewed samples': entry.skewed,
+            })
+            for phase, columns in PHASE_COLUMNS.items():
+                for column in columns:
+                    quantile = 0.99 if 'p99' in column else 0.50
+                    rows[-1][column] = round(entry.phases[phase].quantile(quantile), 2)
+            clock = entry.clock
+            rows[-1].update(zip(CLOCK_COLUMNS, (round(clock.offset, 2), round(clock.uncertainty, 2),
+                                                round(clock.up.quantile(0.50), 2),
+                                                round(clock.down.quantile(0.50), 2))))
+        return pd.DataFrame(rows)
+
+
+def summarize_latencies(df: pd.DataFrame) -> pd.DataFrame:
+    """Statistiques par (région, exchange, type) d'un DataFrame de mesures déjà chargé"""
+    return LatencyAggregator().add_frame(df).summary_frame()
+
+
+class AdaptiveSampler:
+    """Planifie les mesures adaptatives : plus d'échantillons pour les paires bruitées, plus rien pour celles
+    dont l'IC des p50/p99 est assez étroit ou dont le budget est épuisé"""
+
+    QUANTILES = (0.50, 0.99)
+    # Échantillons par paire et par mesure : au plus ROUND_GROWTH fois le volume de base (PROBE_*SAMPLES)
+    ROUND_GROWTH = 10
+    # Plancher avant convergence : sous ce volume, l'IC de Maritz-Jarrett du p99 extrapole depuis le maximum
+    MIN_SAMPLES = 30
+    # Paires arrêtées sans avoir atteint l'IC visé (ou encore en cours à la fin du temps imparti)
+    STATE_LABELS = {'budget': "budget épuisé", 'unreachable': "injoignable", 'pending': "durée écoulée"}
+
+    def __init__(self, aggregator: "LatencyAggregator", endpoints_by_region: Dict[str, Dict],
+                 methods: List[str] = PROBE_METHODS, ci_target: float = ADAPTIVE_CI_TARGET,
+                 ci_floor_ms: float = ADAPTIVE_CI_FLOOR_MS, max_samples: int = ADAPTIVE_MAX_SAMPLES):
+        self.aggregator = aggregator
+        self.endpoints_by_region = endpoints_by_region
+        # Flux WebSocket : durée fixe par mesure, hors échantillonnage adaptatif
+        self.methods = [method for method in methods if method != 'ws']
+        self.ci_target = ci_target
+        self.ci_floor_ms = ci_floor_ms
+        self.max_samples = max_samples
+        self.pending = 0
+        self.requested = 0
+        # État de chaque paire (région, exchange, méthode, edge) à la dernière planification
+        self.states: Dict[Tuple[str, str, str, str], str] = {}
+
+    @staticmethod
+    def probe_key(exchange: str, method: str, edge: str = '') -> str:
+        """Clé de résultat de la sonde distante ("exchange", "exchange@tcp", "exchange#ip"...)"""
+        key = exchange if method == 'http' else f"{exchange}@{method}"
+        return f"{key}#{edge}" if edge else key
+
+    def next_samples(self, entry: "AggregateEntry", method: str) -> int:
+        """Échantillons à demander au prochain tour pour une paire (0 = convergée ou budget épuisé)"""
+        return self.assess(entry, method)[0]
+
+    def assess(self, entry: "AggregateEntry", method: str) -> Tuple[int, str]:
+        """(échantillons à demander, état) d'une paire ; état : 'pending', 'converged', 'budget'
+        (budget épuisé avant convergence) ou 'unreachable' (aucun succès sur toute une mesure)"""
+        base = PROBE_SAMPLES if method == 'http' else PROBE_PING_SAMPLES
+        if entry is None:
+            return base, 'pending'
+        hist = entry.histogram
+        if not hist.count and entry.errors >= base:
+            # Endpoint injoignable sur toute une mesure : inutile d'insister
+            return 0, 'unreachable'
+        needed = max(hist.count, self.MIN_SAMPLES)
+        for q in self.QUANTILES:
+            low, high = hist.quantile_interval(q)
+            if math.isnan(low):
+                # Pas encore assez d'échantillons pour borner ce quantile
+                needed = max(needed, 2 * hist.count, hist.count + base)
+                continue
+            half_width = (high - low) / 2
+            tolerance = max(self.ci_target * hist.quantile(q), self.ci_floor_ms)
+            if half_width > tolerance:
+                # La largeur de l'IC décroît en 1/sqrt(n)
+                needed = max(needed, math.ceil(hist.count * (half_width / tolerance) ** 2))
+        if needed <= hist.count:
+            return 0, 'converged'
+        remaining = self.max_samples - (hist.count + entry.errors)
+        if remaining <= 0:
+            return 0, 'budget'
+        return min(remaining, max(base, min(needed - hist.count, base * self.ROUND_GROWTH))), 'pending'
+
+    def region_counts(self, region: str) -> Dict[str, int]:
+        """Volumes par clé de sonde d'une région pour la prochaine mesure (0 = paire convergée)"""
+        entries = {(key[0], key[1], key[3], key[4]): entry for key, entry in self.aggregator.entries.items()}
+        name = region_name(region)
+        counts = {}
+        for exchange in self.endpoints_by_region.get(region, {}):
+            for method in self.methods:
+                edges = [''] + [key[3] for key in entries if key[:3] == (name, exchange, method) and key[3]]
+                for edge in edges:
+                    pair = (name, exchange, method, edge)
+                    counts[self.probe_key(exchange, method, edge)], self.states[pair] = self.assess(
+                        entries.get(pair), method)
+        return counts
+
+    def plan(self) -> Dict[str, Dict]:
+        """Endpoints et volumes par région pour la prochaine mesure ; {} quand plus aucune paire n'est à mesurer"""
+        plan = {}
+        self.pending = self.requested = 0
+        self.states = {}
+        for region, endpoints in self.endpoints_by_region.items():
+            counts = self.region_counts(region)
+            active = {key: count for key, count in counts.items() if count}
+            if not active:
+                continue
+            self.pending += len(active)
+            self.requested += sum(active.values())
+            wanted = {key.split('#')[0].split('@')[0] for key in active}
+            plan[region] = {
+                'endpoints': {exchange: url for exchange, url in endpoints.items() if exchange in wanted},
+                'sample_counts': counts,
+            }
+        return plan
+
+    def finished(self) -> bool:
+        """Plus rien à mesurer : chaque paire a convergé, épuisé son budget ou reste injoignable"""
+        return not self.plan()
+
+    def converged(self) -> bool:
+        """Toutes les paires ont atteint l'IC visé (un budget épuisé n'est pas une convergence)"""
+        return self.finished() and all(state == 'converged' for state in self.states.values())
+
+    def unconverged_frame(self) -> pd.DataFrame:
+        """Paires hors de l'IC visé à la dernière planification : état et demi-largeur des IC p50/p99 (%)"""
+        entries = {(key[0], key[1], key[3], key[4]): entry for key, entry in self.aggregator.entries.items()}
+        rows = []
+        for pair, state in sorted(self.states.items()):
+            if state == 'converged':
+                continue
+            entry = entries.get(pair)
+            hist = entry.histogram if entry else LatencyHistogram()
+            row = dict(zip(('Region', 'Exchange', 'Method', 'Edge IP'), pair), Count=hist.count)
+            for q in self.QUANTILES:
+                low, high = hist.quantile_interval(q)
+                value = hist.quantile(q)
+                row[f"p{q * 100:g} CI ± (%)"] = round(50 * (high - low) / value, 1) if value > 0 else math.nan
+            row['State'] = self.STATE_LABELS[state]
+            rows.append(row)
+        return pd.DataFrame(rows)
+
+
+def latency_style(value: float) -> str:
+    """Couleur rich associée à une latence (mêmes seuils que le rapport final)"""
+    if value < LATENCY_GREEN_MS:
+        return "green"
+    if value <= LATENCY_ORANGE_MS:
+        return "dark_orange"
+    return "red"
+
+
+# Villes des régions découvertes via l'API (mode matrice), pour les régions absentes de REGION_EXCHANGE_MAP
+REGION_NAMES: Dict[str, str] = {}
+
+
+def slot_region(slot: str) -> str:
+    """Code de région d'un emplacement d'instance ("nrt" ou "nrt-2" pour le 2e shard)"""
+    return slot.split('-')[0]
+
+
+def shard_slot(region: str, shard: int) -> str:
+    return region if shard == 0 else f"{region}-{shard + 1}"
+
+
+def region_name(region: str) -> str:
+    """Nom lisible d'une région Vultr ou d'un shard (code si inconnue)"""
+    code = slot_region(region)
+    return REGION_EXCHANGE_MAP.get(code, {}).get('name') or REGION_NAMES.get(code, code)
+
+
+def exchange_type(exchange: str) -> str:
+    """CEX si l'exchange figure parmi les CEX d'une région, DEX sinon"""
+    return 'CEX' if any(exchange in config.get('cex', {}) for config in REGION_EXCHANGE_MAP.values()) else 'DEX'
+
+
+def matrix_endpoints() -> Dict[str, str]:
+    """Union des endpoints de toutes les régions, dédupliquée par URL"""
+    endpoints: Dict[str, str] = {}
+    seen = set()
+    for config in REGION_EXCHANGE_MAP.values():
+        for kind in ('cex', 'dex'):
+            for name, url in config.get(kind, {}).items():
+                if url in seen:
+                    continue
+                seen.add(url)
+                # Même nom, URL différente : suffixe pour garder les deux
+                endpoints[name if name not in endpoints else f"{name}-{len(seen)}"] = url
+    return endpoints
+
+
+def shard_endpoints(endpoints: Dict[str, str], shards: int) -> List[Dict[str, str]]:
+    """Répartit les endpoints sur `shards` instances à charge équilibrée (plus gros groupe d'abord vers le shard
+    le moins chargé) ; les endpoints d'un même hôte restent ensemble pour partager connexions et débit max"""
+    by_host: Dict[str, Dict[str, str]] = {}
+    for name, url in endpoints.items():
+        by_host.setdefault(urlparse(url).hostname, {})[name] = url
+    parts: List[Dict[str, str]] = [{} for _ in range(max(1, shards))]
+    for group in sorted(by_host.values(), key=len, reverse=True):
+        min(parts, key=len).update(group)
+    return [part for part in parts if part]
+
+
+class LiveDashboard:
+    """Tableau de bord terminal (rich.live) rafraîchi à cadence fixe depuis l'état en mémoire"""
+
+    SPARK_CHARS = "▁▂▃▄▅▆▇█"
+
+    def __init__(self, aggregator: "LatencyAggregator", tester: "LatencyTester", fps: float = LIVE_FPS):
+        self.aggregator = aggregator
+        self.tester = tester
+        self.period = 1.0 / max(fps, 0.1)
+        self.started_at = time.time()
+        self._task = None
+        # Import différé : rich n'est nécessaire qu'avec LIVE_DASHBOARD
+        from rich.console import Console
+        self._console = Console()
+
+    @classmethod
+    def sparkline(cls, values: List[float]) -> str:
+        if not values:
+            return ""
+        low, high = min(values), max(values)
+        span = (high - low) or 1.0
+        top = len(cls.SPARK_CHARS) - 1
+        return "".join(cls.SPARK_CHARS[round((v - low) / span * top)] for v in values)
+
+    def _matrix(self) -> "Table":
+        from rich.table import Table
+        from rich.text import Text
+        # Adresse choisie par le résolveur uniquement ; le détail par edge est dans le rapport final
+        entries = {key[:4]: entry for key, entry in self.aggregator.entries.items() if not key[4]}
+        regions = sorted({key[0] for key in entries})
+        exchanges = sorted({(key[1], key[2], key[3]) for key in entries})
+        table = Table(title="Latence p50 (ms) · échantillons récents", expand=True)
+        table.add_column("Exchange", style="bold")
+        for region in regions:
+            table.add_column(region, justify="right")
+        for exchange, kind, method in exchanges:
+            cells = []
+            for region in regions:
+                entry = entries.get((region, exchange, kind, method))
+                if entry is None:
+                    cells.append(Text("-", style="dim"))
+                    continue
+                if not entry.histogram.count:
+                    cells.append(Text("échec" if entry.errors else "-", style="red" if entry.errors else "dim"))
+                    continue
+                p50 = entry.histogram.quantile(0.5)
+                cell = Text(f"{p50:.1f} ", style=latency_style(p50))
+                cell.append(self.sparkline(list(entry.recent)), style="dim")
+                cells.append(cell)
+            label = f"{exchange} ({kind})" if method == "http" else f"{exchange} ({kind}, {method})"
+            table.add_row(label, *cells)
+        return table
+
+    def _health(self) -> "Table":
+        from rich.table import Table
+        from rich.text import Text
+        now = time.time()
+        table = Table(title="Santé des régions", expand=True)
+        for column in ("Région", "IP", "État", "Dernière donnée"):
+            table.add_column(column)
+        for region, ip in self.tester.instances.items():
+            health = self.tester.health.get(region, {})
+            state = health.get('state', 'en attente')
+            style = {"ok": "green", "streaming": "green", "erreur": "red", "timeout": "red",
+                     "boot échoué": "red"}.get(state, "yellow")
+            last = health.get('last_data')
+            age = f"{now - last:.0f}s" if last else "-"
+            table.add_row(region_name(region), ip, Text(state, style=style), age)
+        return table
+
+    def render(self):
+        from rich.console import Group
+        from rich.text import Text
+        elapsed = time.time() - self.started_at
+        header = Text(f"⏱️  {elapsed:.0f}s · {self.aggregator.rounds} mesures reçues", style="bold")
+        return Group(header, self._matrix(), self._health())
+
+    async def _refresh_loop(self):
+        from rich.live import Live
+        from rich.logging import RichHandler
+        # Le handler console écrit sur le stderr capturé à sa création, sous le Live qui ne le redirige pas :
+        # pendant le tableau de bord, les logs passent par la console du Live (affichés au-dessus du tableau)
+        streams = [handler for handler in logger.handlers if type(handler) is logging.StreamHandler]
+        live_handler = RichHandler(console=self._console, show_path=False)
+        live_handler.setLevel(logging.INFO)
+        for handler in streams:
+            logger.removeHandler(handler)
+        logger.addHandler(live_handler)
+        try:
+            with Live(self.render(), console=self._console, auto_refresh=False) as live:
+                try:
+                    while True:
+                        await asyncio.sleep(self.period)
+                        live.update(self.render(), refresh=True)
+                finally:
+                    live.update(self.render(), refresh=True)
+        finally:
+            logger.removeHandler(live_handler)
+            for handler in streams:
+                logger.addHandler(handler)
+
+    def start(self):
+        self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+# Bornes des histogrammes Prometheus (secondes) : latences sondées et durées des spans
+PROBE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+SPAN_BUCKETS = (0.01, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+METRIC_HELP = {
+    'latency_probe_seconds': ('histogram', "Latence des échantillons sondés"),
+    'latency_probe_errors_total': ('counter', "Échantillons en échec côté sonde"),
+    'latency_span_seconds': ('histogram', "Durée des phases de l'orchestrateur"),
+    'latency_span_failures_total': ('counter', "Phases terminées en erreur ou en timeout"),
+    'latency_api_throttled_total': ('counter', "Réponses 429/5xx de l'API Vultr avant nouvel essai"),
+    'latency_live_instances': ('gauge', "Instances créées ou adoptées et pas encore détruites"),
+    'latency_last_update_timestamp_seconds': ('gauge', "Dernière écriture des métriques"),
+}
+LABEL_ESCAPES = str.maketrans({'\\': '\\\\', '"': '\\"', '\n': '\\n'})
+# Span courant de la tâche asyncio (parent des spans ouverts dans cette tâche)
+CURRENT_SPAN: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+
+
+class NoopSpan:
+    """Span inerte renvoyé quand l'export est désactivé (aucune horloge, aucune allocation)"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def set(self, outcome: str = None, **attrs):
+        pass
+
+
+NOOP_SPAN = NoopSpan()
+
+
+class Span:
+    """Phase chronométrée : durée, issue (ok/error/timeout) et attributs (région, itération...)"""
+    __slots__ = ('tracer', 'name', 'attrs', 'span_id', 'parent_id', 'outcome', 'started_at', '_start', '_token')
+
+    def __init__(self, tracer: "Tracer", name: str, attrs: Dict):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+        self.span_id = uuid.uuid4().hex[:16]
+        self.outcome = 'ok'
+
+    def __enter__(self):
+        self.parent_id = CURRENT_SPAN.get()
+        self._token = CURRENT_SPAN.set(self.span_id)
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self._start
+        CURRENT_SPAN.reset(self._token)
+        if exc_type is not None:
+            self.outcome = 'timeout' if issubclass(exc_type, asyncio.TimeoutError) else 'error'
+            self.attrs['error'] = repr(exc)
+        self.tracer.finish(self, duration)
+        return False
+
+    def set(self, outcome: str = None, **attrs):
+        if outcome:
+            self.outcome = outcome
+        self.attrs.update(attrs)
+
+
+class Tracer:
+    """Spans JSON lines et métriques Prometheus (fichier texte) de l'orchestrateur.
+    Sans TRACE_PATH ni METRICS_TEXTFILE, span() renvoie NOOP_SPAN et les métriques ne sont pas tenues."""
+
+    def __init__(self, trace_path: str = TRACE_PATH, metrics_path: str = METRICS_TEXTFILE):
+        self.trace_path = trace_path
+        self.metrics_path = metrics_path
+        self.enabled = bool(trace_path or metrics_path)
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.counters: Dict[Tuple, float] = {}
+        self.gauges: Dict[Tuple, float] = {}
+        self.histograms: Dict[Tuple, List] = {}
+        self.live_instances = set()
+        self._lock = threading.Lock()
+        self._trace_file = None
+
+    def span(self, name: str, **attrs):
+        return Span(self, name, attrs) if self.enabled else NOOP_SPAN
+
+    def record(self, name: str, started_at: float, duration: float, outcome: str = 'ok', **attrs):
+        """Span déjà terminé (phase observée par polling, ex. instance devenue active)"""
+        if not self.enabled:
+            return
+        span = Span(self, name, attrs)
+        span.parent_id = CURRENT_SPAN.get()
+        span.started_at = started_at
+        span.outcome = outcome
+        self.finish(span, duration)
+
+    def finish(self, span: Span, duration: float):
+        self.observe('latency_span_seconds', duration, SPAN_BUCKETS, span=span.name, outcome=span.outcome)
+        if span.outcome != 'ok':
+            self.inc('latency_span_failures_total', span=span.name, outcome=span.outcome)
+        if not self.trace_path:
+            return
+        line = json.dumps({
+            'trace_id': self.trace_id, 'span_id': span.span_id, 'parent_id': span.parent_id,
+            'name': span.name, 'start': round(span.started_at, 6), 'duration_ms': round(duration * 1000, 3),
+            'outcome': span.outcome, **span.attrs,
+        }, default=str)
+        with self._lock:
+            if self._trace_file is None:
+                self._trace_file = open(self.trace_path, 'a', buffering=1)
+            self._trace_file.write(line + '\n')
+
+    @staticmethod
+    def _key(name: str, labels: Dict) -> Tuple:
+        return (name, tuple(sorted((key, str(value)) for key, value in labels.items())))
+
+    def inc(self, name: str, value: float = 1, **labels):
+        if not self.enabled:
+            return
+        key = self._key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def gauge(self, name: str, value: float, **labels):
+        if self.enabled:
+            self.gauges[self._key(name, labels)] = value
+
+    def observe(self, name: str, value: float, buckets: Tuple[float, ...], **labels):
+        if not self.enabled:
+            return
+        key = self._key(name, labels)
+        with self._lock:
+            state = self.histograms.get(key)
+            if state is None:
+                state = self.histograms[key] = [buckets, [0] * len(buckets), 0.0, 0]
+            # Compteurs par bucket non cumulés ici, cumulés à l'écriture
+            index = bisect.bisect_left(buckets, value)
+            if index < len(buckets):
+                state[1][index] += 1
+            state[2] += value
+            state[3] += 1
+
+    def observe_rows(self, rows: pd.DataFrame):
+        """Échantillons et erreurs d'une mesure (une observation par échantillon, en secondes)"""
+        if not self.enabled or rows.empty:
+            return
+        for row in rows[['Region', 'Exchange', 'Method', 'Samples', 'Errors']].itertuples(index=False):
+            labels = {'region': row.Region, 'exchange': row.Exchange, 'method': row.Method}
+            for value in row.Samples:
+                self.observe('latency_probe_seconds', value / 1000.0, PROBE_BUCKETS, **labels)
+            if row.Errors:
+                self.inc('latency_probe_errors_total', row.Errors, **labels)
+
+    def instance_up(self, instance_id: str):
+        # Écrit tout de suite : un run interrompu laisse la jauge à jour pour l'alerte de fuite
+        if self.enabled:
+            self.live_instances.add(instance_id)
+            self.gauge('latency_live_instances', len(self.live_instances))
+            self.write_metrics()
+
+    def instance_down(self, instance_id: str):
+        if self.enabled:
+            self.live_instances.discard(instance_id)
+            self.gauge('latency_live_instances', len(self.live_instances))
+            self.write_metrics()
+
+    @staticmethod
+    def _labels(labels: Tuple, extra: str = "") -> str:
+        # Échappement des valeurs de labels du format texte Prometheus
+        parts = [f'{key}="{value.translate(LABEL_ESCAPES)}"' for key, value in labels]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def write_metrics(self):
+        """Écrit le fichier texte Prometheus (remplacement atomique, lu à tout moment par node_exporter)"""
+        if not self.metrics_path:
+            return
+        self.gauge('latency_last_update_timestamp_seconds', time.time())
+        by_name: Dict[str, List[str]] = {}
+        with self._lock:
+            for (name, labels), value in list(self.counters.items()) + list(self.gauges.items()):
+                # repr : précision complète (un horodatage en :g n'a que 6 chiffres significatifs)
+                by_name.setdefault(name, []).append(f"{name}{self._labels(labels)} {float(value)!r}")
+            for (name, labels), (buckets, counts, total, count) in self.histograms.items():
+                lines = by_name.setdefault(name, [])
+                cumulative = 0
+                for bound, bucket_count in zip(buckets, counts):
+                    cumulative += bucket_count
+                    bucket_labels = self._labels(labels, f'le="{bound:g}"')
+                    lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+                bucket_labels = self._labels(labels, 'le="+Inf"')
+                lines.append(f"{name}_bucket{bucket_labels} {count}")
+                lines.append(f"{name}_sum{self._labels(labels)} {total:.6f}")
+                lines.append(f"{name}_count{self._labels(labels)} {count}")
+        output = []
+        for name in sorted(by_name):
+            kind, help_text = METRIC_HELP.get(name, ('untyped', name))
+            output += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", *by_name[name]]
+        temporary = f"{self.metrics_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary, 'w') as f:
+            f.write("\n".join(output) + "\n")
+        os.replace(temporary, self.metrics_path)
+
+    def close(self):
+        self.write_metrics()
+        if self._trace_file is not None:
+            self._trace_file.close()
+            self._trace_file = None
+
+
+TRACER = Tracer()
+
+
+class VultrDeployer:
+    def __init__(self, api_key: str, run_tag: str = None):
+        self.api_key = api_key
+        self.base_url = VULTR_API_URL
+        self.headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        }
+        self.instances = {}
+        # Tag commun aux instances du run : un seul GET /instances filtré suffit pour les suivre
+        self.run_tag = run_tag or f"arb-test-run-{int(time.time())}"
+        self.tags = [self.run_tag]
+        # Session HTTP partagée (keep-alive : un seul handshake TLS par connexion du pool)
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=VULTR_MAX_WORKERS)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _request(self, method: str, path: str, **kwargs) -> requests.Response:
+        """Appel API avec retry/backoff : 429 toujours, 5xx seulement pour les méthodes idempotentes"""
+        idempotent = method.upper() in ("GET", "DELETE")
+        delay = 1.0
+        for attempt in range(1, VULTR_API_RETRIES + 1):
+            try:
+                response = self.session.request(method, f"{self.base_url}{path}", timeout=30, **kwargs)
+            except requests.RequestException as e:
+                if not idempotent or attempt == VULTR_API_RETRIES:
+                    raise
+                logger.info(f"Erreur réseau API {method} {path} ({e}), nouvel essai {attempt}/{VULTR_API_RETRIES}")
+            else:
+                retryable = response.status_code == 429 or (idempotent and response.status_code >= 500)
+                if not retryable or attempt == VULTR_API_RETRIES:
+                    return response
+                TRACER.inc('latency_api_throttled_total', method=method.upper(), status=response.status_code)
+                retry_after = response.headers.get("Retry-After", "")
+                if retry_after.isdigit():
+                    delay = max(delay, float(retry_after))
+                logger.info(f"API {method} {path}: {response.status_code}, nouvel essai dans {delay:.1f}s")
+            time.sleep(delay)
+            delay = min(delay * 2, 30.0)
+        return response
+        
+    def get_regions(self) -> Dict:
+        """Récupère la liste des régions disponibles"""
+        response = self._request("GET", "/regions")
+        if response.ok:
+            return response.json()
+        logger.error(f"Erreur API get_regions: {response.status_code} {response.text}")
+        return {}
+
+    def get_available_regions(self, plan: str = VULTR_PLAN_ID) -> Dict[str, Dict]:
+        """Régions où le plan est disponible ({code: région}), disponibilités interrogées en parallèle"""
+        regions = {region['id']: region for region in self.get_regions().get('regions', [])}
+
+        def available(region: str) -> bool:
+            response = self._request("GET", f"/regions/{region}/availability")
+            if not response.ok:
+                logger.error(f"Erreur API availability {region}: {response.status_code} {response.text}")
+                return False
+            return plan in response.json().get('available_plans', [])
+
+        with ThreadPoolExecutor(max_workers=VULTR_MAX_WORKERS) as pool:
+            flags = dict(zip(regions, pool.map(available, regions)))
+        return {code: region for code, region in regions.items() if flags[code]}
+    
+    def create_instance(self, region: str, label: str) -> str:
+        """Crée une instance dans une région spécifique (ou pour un shard "nrt-2" de cette région)"""
+        # Build optional SSH public key injection block (fallback)
+        public_key_content = SSH_PUBLIC_KEY
+        # If no explicit public key path, try to derive from SSH_KEY_PATH + '.pub'
+        derived_pub = f"{SSH_KEY_PATH}.pub" if SSH_KEY_PATH else ""
+        public_key_path = SSH_PUBLIC_KEY_PATH
+        if not public_key_path and derived_pub and os.path.exists(derived_pub):
+            public_key_path = derived_pub
+        if not public_key_content and public_key_path and os.path.exists(public_key_path):
+            try:
+                with open(public_key_path, 'r') as pkf:
+                    public_key_content = pkf.read().strip()
+            except Exception as e:
+                logger.error(f"Erreur lecture SSH_PUBLIC_KEY_PATH: {e}")
+
+        public_key_block = ""
+        if public_key_content:
+            public_key_block = f"""
+mkdir -p /root/.ssh
+chmod 700 /root/.ssh
+echo '{public_key_content}' >> /root/.ssh/authorized_keys
+chmod 600 /root/.ssh/authorized_keys
+chown -R root:root /root/.ssh
+"""
+
+        # Profil "fast" : pas d'apt/pip, la sonde n'utilise que la bibliothèque standard
+        packages_block = ""
+        if BOOT_PROFILE != "fast":
+            packages_block = """
+apt-get update
+apt-get install -y python3-pip curl net-tools
+pip3 install aiohttp requests pandas numpy
+"""
+
+        startup_script = """#!/bin/bash
+""" + public_key_block + packages_block + """
+cat > /root/latency_test.py << 'EOF'
+""" + REMOTE_PROBE_SCRIPT + """EOF
+""" + f"""
+# Marqueur attendu par l'orchestrateur : cloud-init a terminé
+date +%s > {PROBE_READY_MARKER}
+"""
+        # Vultr API attend un user_data encodé en base64
+        encoded_user_data = base64.b64encode(startup_script.encode("utf-8")).decode("ascii")
+        
+        data = {
+            "region": slot_region(region),
+            "plan": VULTR_PLAN_ID,
+            "os_id": VULTR_OS_ID,
+            "label": label,
+            "hostname": label,
+            "enable_ipv6": True,
+            "user_data": encoded_user_data,
+            "backups": "disabled",
+            "tags": list(self.tags)
+        }
+
+        # Attach SSH key(s) via Vultr API if provided (expects an array: sshkey_ids)
+        ssh_ids = []
+        if VULTR_SSH_KEY_IDS:
+            ssh_ids = [s.strip() for s in VULTR_SSH_KEY_IDS.split(',') if s.strip()]
+        elif VULTR_SSH_KEY_ID:
+            ssh_ids = [VULTR_SSH_KEY_ID]
+        if ssh_ids:
+            data["sshkey_ids"] = ssh_ids
+            logger.info(f"Création instance {region}: sshkey_ids={ssh_ids}")
+        
+        with TRACER.span('provision', region=region) as span:
+            response = self._request("POST", "/instances", json=data)
+            span.set(status=response.status_code)
+
+            if response.status_code == 202:
+                instance_data = response.json()
+                instance_id = instance_data['instance']['id']
+                self.instances[region] = instance_id
+                TRACER.instance_up(instance_id)
+                return instance_id
+            else:
+                span.set('error')
+                logger.error(f"Erreur création instance {region}: {response.status_code} {response.text}")
+                return None
+
+    def create_instances(self, regions: List[str], label_prefix: str = "arb-test") -> Dict[str, str]:
+        """Crée les instances de plusieurs régions en parallèle"""
+        stamp = int(time.time())
+        with ThreadPoolExecutor(max_workers=VULTR_MAX_WORKERS) as pool:
+            # Contexte copié par appel : les spans des threads restent rattachés au span courant
+            futures = {
+                region: pool.submit(contextvars.copy_context().run, self.create_instance, region,
+                                    f"{label_prefix}-{region}-{stamp}")
+                for region in regions
+            }
+            return {region: future.result() for region, future in futures.items()}
+    
+    def get_instance_info(self, instance_id: str) -> Dict:
+        """Récupère les infos d'une instance"""
+        response = self._request("GET", f"/instances/{instance_id}")
+        if response.ok:
+            return response.json()['instance']
+        logger.error(f"Erreur API get_instance_info: {response.status_code} {response.text}")
+        return {}
+
+    def list_instances(self, tag: str = None, label: str = None) -> List[Dict]:
+        """Liste les instances (filtrées par tag/label), pagination incluse"""
+        params = {"per_page": 500}
+        if tag:
+            params["tag"] = tag
+        if label:
+            params["label"] = label
+        instances = []
+        while True:
+            response = self._request("GET", "/instances", params=params)
+            if not response.ok:
+                logger.error(f"Erreur API list_instances: {response.status_code} {response.text}")
+                return instances
+            payload = response.json()
+            instances.extend(payload.get('instances', []))
+            cursor = payload.get('meta', {}).get('links', {}).get('next')
+            if not cursor:
+                return instances
+            params["cursor"] = cursor
+    
+    def wait_for_instances(self, timeout: int = 300, instances: Dict[str, str] = None):
+        """Attend que les instances (toutes par défaut) soient prêtes (un seul appel liste par tour, intervalle adaptatif)"""
+        instances = self.instances if instances is None else instances
+        start_time = time.time()
+        ready = {}
+        region_by_id = {instance_id: region for region, instance_id in instances.items() if instance_id}
+        interval = VULTR_POLL_MIN
+        
+        while len(ready) < len(region_by_id) and (time.time() - start_time) < timeout:
+            progressed = False
+            for info in self.list_instances(tag=self.run_tag):
+                region = region_by_id.get(info.get('id'))
+                if region and region not in ready and info.get('status') == 'active' and info.get('power_status') == 'running':
+                    ready[region] = info['main_ip']
+                    progressed = True
+                    TRACER.record('active', start_time, time.time() - start_time, region=region)
+                    print(f"✅ {region} prêt: {info['main_ip']}")
+            
+            if len(ready) < len(region_by_id):
+                # Les instances démarrent souvent par vagues : on repasse vite après un progrès
+                interval = VULTR_POLL_MIN if progressed else min(interval * 1.5, VULTR_POLL_MAX)
+                time.sleep(interval)
+
+        for region in set(region_by_id.values()) - set(ready):
+            TRACER.record('active', start_time, time.time() - start_time, 'timeout', region=region)
+        return ready
+    
+    def destroy_instance(self, instance_id: str):
+        """Détruit une instance"""
+        with TRACER.span('teardown', instance=instance_id) as span:
+            response = self._request("DELETE", f"/instances/{instance_id}")
+            if response.status_code != 204:
+                span.set('error', status=response.status_code)
+                logger.error(f"Erreur suppression instance {instance_id}: {response.status_code} {response.text}")
+            else:
+                TRACER.instance_down(instance_id)
+        return response.status_code == 204
+
+    def destroy_instances(self, instances: Dict[str, str]) -> Dict[str, bool]:
+        """Détruit plusieurs instances en parallèle ({région: id} -> {région: succès})"""
+        with ThreadPoolExecutor(max_workers=VULTR_MAX_WORKERS) as pool:
+            futures = {region: pool.submit(contextvars.copy_context().run, self.destroy_instance, instance_id)
+                       for region, instance_id in instances.items()}
+            return {region: future.result() for region, future in futures.items()}
+
+class InstancePool:
+    """Pool d'instances persistant (fichier d'état + baux) réutilisé d'un run à l'autre"""
+
+    def __init__(self, path: str = POOL_STATE_PATH, ttl_minutes: float = POOL_TTL_MINUTES):
+        self.path = path
+        self.ttl_s = ttl_minutes * 60
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+
+    @contextmanager
+    def _locked(self):
+        """Verrou exclusif sur le fichier d'état, puis lecture/écriture atomique"""
+        with open(f"{self.path}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                records = []
+                if os.path.exists(self.path):
+                    with open(self.path) as f:
+                        records = json.load(f).get('instances', [])
+                yield records
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, "w") as f:
+                    json.dump({'instances': records}, f, indent=2)
+                os.replace(tmp_path, self.path)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _lease_is_live(self, record: Dict) -> bool:
+        """Un bail est valide tant que son processus propriétaire (même machine) tourne"""
+        owner = record.get('lease_owner')
+        if not owner:
+            return False
+        host, _, pid = owner.rpartition(":")
+        if host == socket.gethostname() and pid.isdigit():
+            try:
+                os.kill(int(pid), 0)
+                return True
+            except ProcessLookupError:
+                return False
+            except PermissionError:
+                return True
+        return time.time() - record.get('leased_at', 0) < POOL_LEASE_TIMEOUT
+
+    def _expired(self, record: Dict, now: float) -> bool:
+        """Instance inactive depuis plus que le TTL : promise à reap(), jamais adoptée"""
+        return now - (record.get('last_used') or record['created_at']) > self.ttl_s
+
+    def adopt(self, deployer: "VultrDeployer", regions: List[str]) -> Dict[str, Dict]:
+        """Prend à bail une instance libre et active par région ({région: enregistrement})"""
+        live = {info['id']: info for info in deployer.list_instances(tag=POOL_TAG)}
+        adopted = {}
+        now = time.time()
+        with self._locked() as records:
+            # Les instances disparues côté Vultr sortent du pool
+            records[:] = [r for r in records if r['id'] in live]
+            for record in records:
+                region = record['region']
+                info = live[record['id']]
+                if (region in regions and region not in adopted and not self._lease_is_live(record)
+                        and not self._expired(record, now)
+                        and record.get('boot_profile') == BOOT_PROFILE
+                        and info.get('status') == 'active' and info.get('power_status') == 'running'):
+                    record.update(lease_owner=self.owner, leased_at=time.time(), ip=info['main_ip'])
+                    adopted[region] = dict(record)
+        return adopted
+
+    def register(self, region: str, instance_id: str, ip: str, label: str = ""):
+        """Ajoute une instance fraîchement créée, à bail pour ce run"""
+        now = time.time()
+        with self._locked() as records:
+            records[:] = [r for r in records if r['id'] != instance_id]
+            records.append({
+                'id': instance_id, 'region': region, 'ip': ip, 'label': label,
+                'created_at': now, 'last_used': now, 'boot_profile': BOOT_PROFILE,
+                'probe_hash': PROBE_SCRIPT_HASH, 'lease_owner': self.owner, 'leased_at': now,
+            })
+
+    def mark_probe_installed(self, instance_ids: List[str]):
+        with self._locked() as records:
+            for record in records:
+                if record['id'] in instance_ids:
+                    record['probe_hash'] = PROBE_SCRIPT_HASH
+
+    def release(self):
+        """Libère les baux de ce run : les instances restent disponibles jusqu'au TTL"""
+        with self._locked() as records:
+            for record in records:
+                if record.get('lease_owner') == self.owner:
+                    record.update(lease_owner=None, leased_at=None, last_used=time.time())
+
+    def forget(self, instance_ids: List[str]):
+        with self._locked() as records:
+            records[:] = [r for r in records if r['id'] not in instance_ids]
+
+    def reap(self, deployer: "VultrDeployer") -> List[str]:
+        """Détruit les instances libres inactives depuis plus que le TTL.
+        Les instances expirées sont prises à bail sous le verrou avant destruction : un adopt() concurrent
+        ne peut plus les louer ; celles dont la destruction échoue sont libérées pour un prochain reap()"""
+        now = time.time()
+        with self._locked() as records:
+            expired = {}
+            for record in records:
+                if not self._lease_is_live(record) and self._expired(record, now):
+                    record.update(lease_owner=self.owner, leased_at=now)
+                    expired[record['region'] + ":" + record['id']] = record['id']
+        if not expired:
+            return []
+        results = deployer.destroy_instances(expired)
+        destroyed = [instance_id for key, instance_id in expired.items() if results.get(key)]
+        failed = [instance_id for key, instance_id in expired.items() if not results.get(key)]
+        with self._locked() as records:
+            records[:] = [r for r in records if r['id'] not in destroyed]
+            for record in records:
+                if record['id'] in failed:
+                    record.update(lease_owner=None, leased_at=None)
+        return destroyed
+
+class ResultsStore:
+    """Store Parquet append-only partitionné par date et région (date=AAAA-MM-JJ/Region=<nom>/).
+    Chaque mesure est écrite dans son propre fichier, de façon atomique : un crash ne perd que la mesure en cours.
+    En fin de run, compact() fusionne les fichiers d'un run en un fichier trié par partition."""
+
+    # Colonnes lues en catégories (pandas) ; Parquet les stocke déjà en encodage dictionnaire
+    DICTIONARY_COLUMNS = ['run_id', 'Region', 'Exchange', 'Type', 'Method', 'Edge IP']
+    ROW_GROUP_SIZE = 65536
+
+    def __init__(self, root: str = RESULTS_STORE_PATH):
+        # Import différé : pyarrow n'est nécessaire que pour le store
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        import pyarrow.parquet as pq
+        self.pa, self.ds, self.pq = pa, ds, pq
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.schema = pa.schema(
+            [('run_id', pa.string()), ('Timestamp', pa.timestamp('us')), ('Exchange', pa.string()),
+             ('Type', pa.string()), ('Method', pa.string()), ('Edge IP', pa.string()),
+             ('Latency (ms)', pa.float64())]
+            + [(column, pa.float64()) for column in STAT_COLUMNS]
+            + [('Errors', pa.int32()), ('Samples', pa.list_(pa.float64())), ('Phases', pa.string())]
+        )
+        partition_schema = pa.schema([('date', pa.date32()), ('Region', pa.string())])
+        self.partitioning = ds.partitioning(partition_schema, flavor='hive')
+        self.dataset_schema = pa.unify_schemas([self.schema, partition_schema])
+        self._sequence = 0
+
+    def _partition_dir(self, day, region: str) -> str:
+        return os.path.join(self.root, f"date={day.isoformat()}", f"Region={quote(str(region), safe='')}")
+
+    def _frame(self, df: pd.DataFrame, run_id: str) -> pd.DataFrame:
+        """Normalise un DataFrame de mesures (format _rows_from_results ou ancien CSV) vers le schéma du store"""
+        frame = df.copy()
+        frame['run_id'] = run_id
+        frame['Timestamp'] = pd.to_datetime(frame['Timestamp'])
+        for column, default in (('Method', 'http'), ('Edge IP', ''), ('Errors', 0), ('Phases', {})):
+            if column not in frame:
+                frame[column] = [default] * len(frame)
+            frame[column] = frame[column].map(lambda v: default if not isinstance(v, (str, dict)) and pd.isna(v) else v)
+        if 'Samples' not in frame:
+            frame['Samples'] = [[] for _ in range(len(frame))]
+        for column in ['Latency (ms)'] + STAT_COLUMNS:
+            if column not in frame:
+                frame[column] = math.nan
+        frame['Phases'] = frame['Phases'].map(lambda v: v if isinstance(v, str) else json.dumps(v))
+        frame['Errors'] = frame['Errors'].astype('int32')
+        return frame
+
+    def append(self, df: pd.DataFrame, run_id: str) -> int:
+        """Ajoute une mesure : un fichier par partition, écrit à côté puis renommé (atomique)"""
+        if df.empty:
+            return 0
+        frame = self._frame(df, run_id)
+        self._sequence += 1
+        written = 0
+        for (day, region), part in frame.groupby([frame['Timestamp'].dt.date, 'Region'], sort=False):
+            directory = self._partition_dir(day, region)
+            os.makedirs(directory, exist_ok=True)
+            table = self.pa.Table.from_pandas(part, schema=self.schema, preserve_index=False)
+            path = os.path.join(directory, f"{run_id}-{self._sequence:06d}.parquet")
+            # Préfixe "." : fichier ignoré par les lecteurs tant qu'il n'est pas complet
+            tmp_path = os.path.join(directory, f".{run_id}-{self._sequence:06d}.parquet.tmp")
+            self.pq.write_table(table, tmp_path)
+            os.replace(tmp_path, path)
+            written += len(part)
+        return written
+
+    def _data_dirs(self):
+        """(répertoire, fichiers de données) de chaque partition ; l'index et les fichiers temporaires sont exclus"""
+        for directory, subdirs, names in os.walk(self.root):
+            subdirs[:] = [name for name in subdirs if not name.startswith(('.', '_'))]
+            yield directory, [name for name in names if name.endswith('.parquet') and not name.startswith(('.', '_'))]
+
+    def _merged_fragments(self, path: str) -> set:
+        """Fichiers par mesure déjà fusionnés dans un fichier compacté (métadonnées du schéma)"""
+        metadata = self.pq.read_schema(path).metadata or {}
+        return set(json.loads(metadata.get(b'fragments', b'[]')))
+
+    def _files(self) -> List[str]:
+        """Fichiers de données visibles ; les fichiers par mesure déjà fusionnés (crash pendant compact) sont ignorés"""
+        files = []
+        for directory, names in self._data_dirs():
+            compacted = {name[:-len('.parquet')] for name in names if '-' not in name}
+            for name in sorted(names):
+                run = name.rsplit('-', 1)[0] if '-' in name else None
+                if run in compacted and name in self._merged_fragments(os.path.join(directory, f"{run}.parquet")):
+                    continue
+                files.append(os.path.join(directory, name))
+        return files
+
+    @contextmanager
+    def _locked(self):
+        """Verrou exclusif du store (compaction et index), comme le fichier d'état du pool"""
+        with open(os.path.join(self.root, ".lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def compact(self, run_id: str = None) -> int:
+        """Fusionne les fichiers par mesure d'un run (ou de tous) dans un fichier par partition, trié par
+        exchange puis horodatage pour des statistiques de row groups serrées ; renvoie le nombre de fichiers fusionnés.
+        Sans risque sur un run en cours : les fichiers fusionnés sont listés dans les métadonnées du fichier compacté."""
+        merged = 0
+        with self._locked():
+            for directory, names in self._data_dirs():
+                fragments: Dict[str, List[str]] = {}
+                for name in names:
+                    if '-' in name:
+                        fragments.setdefault(name.rsplit('-', 1)[0], []).append(name)
+                for run, parts in fragments.items():
+                    if run_id is not None and run != run_id:
+                        continue
+                    target = os.path.join(directory, f"{run}.parquet")
+                    done = self._merged_fragments(target) if os.path.exists(target) else set()
+                    pending = sorted(name for name in parts if name not in done)
+                    if pending:
+                        sources = ([target] if os.path.exists(target) else []) + [
+                            os.path.join(directory, name) for name in pending]
+                        table = self.pa.concat_tables([self.pq.read_table(path, schema=self.schema) for path in sources])
+                        table = table.sort_by([('Exchange', 'ascending'), ('Method', 'ascending'),
+                                               ('Timestamp', 'ascending')])
+                        table = table.replace_schema_metadata({'fragments': json.dumps(sorted(done | set(pending)))})
+                        tmp_path = os.path.join(directory, f".{run}.parquet.tmp")
+                        self.pq.write_table(table, tmp_path, row_group_size=self.ROW_GROUP_SIZE)
+                        os.replace(tmp_path, target)
+                        merged += len(pending)
+                    # Le fichier compacté fait foi : les fichiers par mesure fusionnés sont supprimés
+                    for name in parts:
+                        os.remove(os.path.join(directory, name))
+        return merged
+
+    @staticmethod
+    def _run_of(path: str) -> str:
+        return os.path.basename(path)[:-len('.parquet')].split('-')[0]
+
+    def runs(self) -> List[str]:
+        return sorted({self._run_of(path) for path in self._files()})
+
+    def _summarize_run(self, files: List[str]) -> pd.DataFrame:
+        """Statistiques d'un run par clé, calculées de façon vectorisée sur les échantillons aplatis"""
+        import pyarrow.compute as pc
+        keys = list(LatencyAggregator.KEY_COLUMNS)
+        table = self.ds.dataset(files, schema=self.dataset_schema, format='parquet',
+                                partitioning=self.partitioning, partition_base_dir=self.root).to_table(
+            columns=keys + ['Timestamp', 'Latency (ms)', 'Errors', 'Samples'])
+        samples = table.column('Samples')
+        rows = table.drop_columns(['Samples']).to_pandas()
+        values = pd.DataFrame({
+            'row': pc.list_parent_indices(samples).to_numpy(),
+            'value': pc.list_flatten(samples).to_numpy(),
+        })
+        # Anciens CSV : seule la moyenne de la mesure est connue, elle tient lieu d'échantillon
+        lengths = pc.list_value_length(samples).fill_null(0).to_numpy()
+        legacy = np.flatnonzero((lengths == 0) & rows['Latency (ms)'].notna().to_numpy())
+        values = pd.concat([values, pd.DataFrame({'row': legacy, 'value': rows['Latency (ms)'].to_numpy()[legacy]})])
+        values = values.join(rows[keys], on='row')
+        quantiles = values.groupby(keys, observed=True)['value'].quantile([0.5, 0.9, 0.99]).unstack()
+        quantiles.columns = ['p50', 'p90', 'p99']
+        moments = values.groupby(keys, observed=True)['value'].agg(samples='count', mean='mean', std='std')
+        per_key = rows.groupby(keys, observed=True).agg(
+            start=('Timestamp', 'min'), end=('Timestamp', 'max'), rounds=('Timestamp', 'size'), errors=('Errors', 'sum'))
+        summary = per_key.join(moments).join(quantiles).reset_index()
+        summary['samples'] = summary['samples'].fillna(0).astype('int64')
+        return summary
+
+    def summary_index(self) -> pd.DataFrame:
+        """Index des résumés par run (_index/summary.parquet), mis à jour pour les runs nouveaux ou modifiés :
+        l'analyse historique ne relit jamais les échantillons bruts des runs déjà indexés"""
+        index_path = os.path.join(self.root, "_index", "summary.parquet")
+        with self._locked():
+            files_by_run: Dict[str, List[str]] = {}
+            for path in self._files():
+                files_by_run.setdefault(self._run_of(path), []).append(path)
+            mtimes = {run: max(os.path.getmtime(path) for path in files) for run, files in files_by_run.items()}
+            index = pd.read_parquet(index_path) if os.path.exists(index_path) else pd.DataFrame()
+            indexed = index.groupby('run_id')['source_mtime'].first().to_dict() if not index.empty else {}
+            stale = sorted(run for run, mtime in mtimes.items() if indexed.get(run) != mtime)
+            removed = set(indexed) - set(mtimes)
+            if stale or removed:
+                fresh = [self._summarize_run(files_by_run[run]).assign(run_id=run, source_mtime=mtimes[run])
+                         for run in stale]
+                keep = index[~index['run_id'].isin(set(stale) | removed)] if not index.empty else index
+                index = pd.concat([keep] + fresh, ignore_index=True)
+                for column in self.DICTIONARY_COLUMNS:
+                    index[column] = index[column].astype(str)
+                os.makedirs(os.path.dirname(index_path), exist_ok=True)
+                tmp_path = f"{index_path}.tmp"
+                index.to_parquet(tmp_path, index=False)
+                os.replace(tmp_path, index_path)
+        for column in self.DICTIONARY_COLUMNS:
+            if column in index:
+                index[column] = index[column].astype('category')
+        return index
+
+    def dataset(self):
+        """Dataset Arrow de tout le store (partitions date/Region découvertes depuis les chemins)"""
+        return self.ds.dataset(self._files(), schema=self.dataset_schema, format='parquet',
+                               partitioning=self.partitioning, partition_base_dir=self.root)
+
+    def read(self, exchange: str = None, region: str = None, method: str = None, since: datetime = None,
+             until: datetime = None, columns: List[str] = None) -> pd.DataFrame:
+        """Lecture filtrée : les partitions date/région sont élaguées, les autres filtres poussés aux row groups"""
+        ds = self.ds
+        conditions = []
+        if exchange is not None:
+            conditions.append(ds.field('Exchange') == exchange)
+        if region is not None:
+            conditions.append(ds.field('Region') == region)
+        if method is not None:
+            conditions.append(ds.field('Method') == method)
+        if since is not None:
+            conditions.append(ds.field('date') >= since.date())
+            conditions.append(ds.field('Timestamp') >= self.pa.scalar(since, type=self.pa.timestamp('us')))
+        if until is not None:
+            conditions.append(ds.field('date') <= until.date())
+            conditions.append(ds.field('Timestamp') < self.pa.scalar(until, type=self.pa.timestamp('us')))
+        expression = None
+        for condition in conditions:
+            expression = condition if expression is None else expression & condition
+        dataset = self.dataset()
+        if columns is not None:
+            columns = list(dict.fromkeys(columns))
+        df = dataset.to_table(columns=columns, filter=expression).to_pandas()
+        for column in self.DICTIONARY_COLUMNS:
+            if column in df:
+                df[column] = df[column].astype('category')
+        return df
+
+    def import_csv(self, path: str, run_id: str = None) -> int:
+        """Importe un CSV vultr_latency_test_*.csv (toutes versions) comme un run du store ; 0 si déjà importé"""
+        if run_id is None:
+            match = re.search(r"(\d{8}_\d{6})", os.path.basename(path))
+            run_id = match.group(1) if match else os.path.splitext(os.path.basename(path))[0].replace('-', '_')
+        if run_id in self.runs():
+            return 0
+        df = pd.read_csv(path)
+        if df.empty:
+            return 0
+        for column in ('Samples', 'Phases'):
+            if column in df:
+                df[column] = df[column].map(lambda v: json.loads(v) if isinstance(v, str) else None)
+        if 'Samples' in df:
+            df['Samples'] = df['Samples'].map(lambda v: v if isinstance(v, list) else [])
+        written = self.append(df, run_id)
+        self.compact(run_id)
+        return written
+
+
+class LatencyTester:
+    def __init__(self, instances_ips: Dict, concurrency: int = REGION_CONCURRENCY,
+                 region_timeout: float = REGION_TIMEOUT, endpoints: Dict[str, Dict] = None):
+        self.instances = instances_ips
+        # Endpoints par instance (mode matrice) ; sinon CEX et DEX de REGION_EXCHANGE_MAP pour la région
+        self.endpoints = endpoints
+        self.concurrency = max(1, concurrency)
+        self.region_timeout = region_timeout
+        # Options SSH communes (BatchMode pour éviter les prompts, timeout pour éviter les blocages)
+        self.ssh_opts = [
+            "-o", "StrictHostKeyChecking=no",
+            "-o", "BatchMode=yes",
+            "-o", "PasswordAuthentication=no",
+            "-o", f"ConnectTimeout={SSH_CONNECT_TIMEOUT}",
+        ]
+        if SSH_KEY_PATH:
+            self.ssh_opts += ["-i", SSH_KEY_PATH]
+        if SSH_CONTROL_PERSIST > 0:
+            # Une seule connexion TCP+SSH par instance, réutilisée par ssh/scp et par l'agent
+            self.ssh_opts += [
+                "-o", "ControlMaster=auto",
+                "-o", f"ControlPath={os.path.join(tempfile.gettempdir(), 'vultr-ssh-%C')}",
+                "-o", f"ControlPersist={SSH_CONTROL_PERSIST}",
+                "-o", "ServerAliveInterval=15",
+            ]
+        # IPs dont le SSH a déjà répondu (évite un handshake d'attente à chaque mesure)
+        self._ssh_ready = set()
+        # État par région pour le tableau live : {'state', 'since', 'last_data'}
+        self.health: Dict[str, Dict] = {}
+
+    def _set_health(self, region: str, state: str, data: bool = False):
+        health = self.health.setdefault(region, {'last_data': None})
+        health['state'] = state
+        health['since'] = time.time()
+        if data:
+            health['last_data'] = health['since']
+
+    async def _run(self, argv: List[str], input: bytes = None) -> Tuple[int, str, str]:
+        """Exécute une commande sans bloquer la boucle asyncio (tuée si la tâche est annulée)."""
+        proc = await asyncio.create_subprocess_exec(
+            *argv,
+            stdin=asyncio.subprocess.PIPE if input is not None else asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            start_new_session=True,
+        )
+        try:
+            out, err = await proc.communicate(input)
+        finally:
+            if proc.returncode is None:
+                # Tue tout le groupe (ssh et ses enfants) pour libérer les pipes
+                os.killpg(proc.pid, signal.SIGKILL)
+                await proc.wait()
+        return proc.returncode, out.decode(errors="replace"), err.decode(errors="replace")
+
+    async def _wait_for_ssh(self, ip: str, retries: int = SSH_WAIT_RETRIES, delay_s: float = SSH_WAIT_DELAY) -> bool:
+        """Attend que le port SSH accepte la connexion clé (tentatives limitées)."""
+        if ip in self._ssh_ready:
+            return True
+        with TRACER.span('ssh_ready', ip=ip) as span:
+            for attempt in range(1, retries + 1):
+                # SSH joignable ne suffit pas : le marqueur de fin de cloud-init doit exister
+                code, out, _ = await self._run(
+                    ["ssh", *self.ssh_opts, f"root@{ip}", f"test -f {PROBE_READY_MARKER} && echo ok"]
+                )
+                if code == 0 and out.strip() == 'ok':
+                    self._ssh_ready.add(ip)
+                    span.set(attempts=attempt)
+                    return True
+                logger.info(f"SSH pas prêt sur {ip} (tentative {attempt}/{retries}) code={code}")
+                await asyncio.sleep(delay_s)
+            span.set('error', attempts=retries)
+        logger.error(f"SSH indisponible sur {ip} après {retries} tentatives")
+        return False
+
+    async def wait_for_boot(self, timeout_s: float = BOOT_TIMEOUT) -> List[str]:
+        """Attend le marqueur de fin de cloud-init sur toutes les instances avant la première mesure, avec son
+        propre délai : un boot lent n'entame pas le timeout de mesure. Renvoie les régions non prêtes à temps."""
+        retries = max(1, math.ceil(timeout_s / max(SSH_WAIT_DELAY, 0.1)))
+
+        async def wait(region: str, ip: str) -> bool:
+            self._set_health(region, "boot")
+            try:
+                ready = await asyncio.wait_for(self._wait_for_ssh(ip, retries=retries), timeout=timeout_s)
+            except asyncio.TimeoutError:
+                ready = False
+            self._set_health(region, "prêt" if ready else "boot échoué")
+            return ready
+
+        verdicts = await asyncio.gather(*(wait(region, ip) for region, ip in self.instances.items()))
+        return [region for region, ready in zip(self.instances, verdicts) if not ready]
+
+    async def install_probe(self, ip: str) -> bool:
+        """(Ré)installe la sonde courante sur une instance existante (instances du pool)"""
+        code, _, err = await self._run(
+            ["ssh", *self.ssh_opts, f"root@{ip}", "cat > /root/latency_test.py"],
+            input=REMOTE_PROBE_SCRIPT.encode("utf-8"),
+        )
+        if code != 0:
+            logger.error(f"Installation sonde échouée sur {ip}: code={code} stderr={err.strip()}")
+        return code == 0
+
+    async def check_pool_instances(self, adopted: Dict[str, Dict]) -> Dict[str, Dict]:
+        """Vérifie en parallèle les instances adoptées (SSH + marqueur, sonde à jour)"""
+        async def check(record: Dict) -> bool:
+            if not await self._wait_for_ssh(record['ip'], retries=2, delay_s=2):
+                return False
+            if record.get('probe_hash') != PROBE_SCRIPT_HASH:
+                return await self.install_probe(record['ip'])
+            return True
+
+        verdicts = await asyncio.gather(*(check(record) for record in adopted.values()))
+        return {region: record for (region, record), ok in zip(adopted.items(), verdicts) if ok}
+
+    async def test_from_region(self, region: str, ip: str, endpoints: Dict) -> Dict:
+        """Test depuis une région spécifique"""
+        # Fichier d'endpoints propre à la région (les régions tournent en parallèle)
+        endpoints_path = os.path.join(tempfile.gettempdir(), f"endpoints-{region}.json")
+        with open(endpoints_path, 'w') as f:
+            json.dump(endpoints, f)
+
+        # Attendre SSH prêt
+        self._set_health(region, "ssh")
+        if not await self._wait_for_ssh(ip):
+            return {}
+
+        # SCP le fichier vers l'instance
+        self._set_health(region, "scp")
+        with TRACER.span('scp', region=region) as span:
+            code, _, err = await self._run(["scp", *self.ssh_opts, endpoints_path, f"root@{ip}:/root/endpoints.json"])
+            if code != 0:
+                span.set('error', code=code)
+                logger.error(f"SCP échec vers {ip}: code={code} stderr={err.strip()}")
+                self._ssh_ready.discard(ip)
+                return {}
+
+        # Execute le test sur l'instance distante
+        self._set_health(region, "mesure")
+        with TRACER.span('remote_exec', region=region) as span:
+            code, out, err = await self._run(["ssh", *self.ssh_opts, f"root@{ip}", "python3 /root/latency_test.py"])
+            if code != 0:
+                span.set('error', code=code)
+                logger.error(f"SSH échec sur {ip}: code={code} stderr={err.strip()}")
+                self._ssh_ready.discard(ip)
+                return {}
+
+        with TRACER.span('parse', region=region, bytes=len(out)) as span:
+            try:
+                return json.loads(out)
+            except:
+                span.set('error')
+                return {}
+
+    async def _test_region_bounded(self, semaphore: asyncio.Semaphore, region: str, ip: str,
+                                   endpoints: Dict) -> Tuple[Dict, datetime]:
+        """Test d'une région sous plafond de concurrence et timeout (une région lente ne bloque pas les autres)"""
+        async with semaphore:
+            with TRACER.span('region', region=region) as span:
+                print(f"\n🔍 Test depuis {region_name(region)} ({region})...")
+                try:
+                    results = await asyncio.wait_for(
+                        self.test_from_region(region, ip, endpoints), timeout=self.region_timeout
+                    )
+                    self._set_health(region, "ok" if results else "erreur", data=bool(results))
+                    span.set('ok' if results else 'error')
+                except asyncio.TimeoutError:
+                    logger.error(f"Timeout région {region} ({ip}) après {self.region_timeout:.0f}s")
+                    self._set_health(region, "timeout")
+                    span.set('timeout')
+                    results = {}
+                except Exception as e:
+                    logger.error(f"Erreur test région {region} ({ip}): {e}")
+                    self._set_health(region, "erreur")
+                    span.set('error', error=repr(e))
+                    results = {}
+            return results, datetime.now()
+
+    def _region_endpoints(self, region: str) -> Dict:
+        """Endpoints d'une instance : son shard de la matrice, sinon CEX et DEX de sa région"""
+        if self.endpoints is not None:
+            return self.endpoints.get(region, {})
+        if region not in REGION_EXCHANGE_MAP:
+            return {}
+        endpoints = {}
+        endpoints.update(REGION_EXCHANGE_MAP[region].get('cex', {}))
+        endpoints.update(REGION_EXCHANGE_MAP[region].get('dex', {}))
+        return endpoints
+
+    def _region_feeds(self, region: str, endpoints: Dict) -> Dict:
+        """Flux WebSocket d'une instance : ceux de sa région, ou en mode matrice ceux des exchanges de son shard"""
+        if self.endpoints is None:
+            return REGION_EXCHANGE_MAP.get(region, {}).get('ws', {})
+        return {name: feed for config in REGION_EXCHANGE_MAP.values()
+                for name, feed in config.get('ws', {}).items() if name in endpoints}
+
+    def _probe_payload(self, endpoints: Dict, feeds: Dict = None) -> Dict:
+        """Endpoints + paramètres d'échantillonnage transmis à la sonde distante"""
+        return {
+            'endpoints': endpoints,
+            'samples': PROBE_SAMPLES,
+            'interval': PROBE_INTERVAL,
+            'max_inflight': PROBE_MAX_INFLIGHT,
+            'host_rate': PROBE_HOST_RATE,
+            'fresh_connections': PROBE_FRESH_CONNECTIONS,
+            'methods': PROBE_METHODS,
+            'ping_samples': PROBE_PING_SAMPLES,
+            'ping_interval': PROBE_PING_INTERVAL,
+            'ping_host_rate': PROBE_PING_HOST_RATE,
+            'edges': PROBE_EDGES,
+            'dns_ttl': PROBE_DNS_TTL,
+            'clock_endpoints': {name: url for name, url in SERVER_TIME_URLS.items() if name in endpoints},
+            'ws_endpoints': feeds or {},
+            'ws_duration': PROBE_WS_DURATION,
+            'ws_ping_interval': PROBE_WS_PING_INTERVAL,
+        }
+
+    def _rows_from_results(self, region: str, remote_results: Dict, measured_at: datetime) -> List[Dict]:
+        """Convertit le JSON renvoyé par la sonde distante en lignes de résultats"""
+        rows = []
+        for key, stats in remote_results.items():
+            if not isinstance(stats, dict) or not ('samples' in stats or 'avg' in stats):
+                continue
+            # Clé "exchange" (http) ou "exchange@tcp" / "exchange@tls" (pings de handshake),
+            # suffixée de "#<ip>" pour les mesures sur un edge imposé
+            exchange = stats.get('exchange', key)
+            # Les anciennes sondes ne renvoient que min/avg/max
+            samples = [float(v) for v in stats.get('samples', [])]
+            errors = int(stats.get('errors', 0))
+            avg = stats.get('avg')
+            rows.append({
+                'Region': region_name(region),
+                'Exchange': exchange,
+                'Type': exchange_type(exchange),
+                'Method': stats.get('method', 'http'),
+                'Edge IP': stats.get('edge') or '',
+                'Latency (ms)': round(float(avg), 2) if avg is not None else math.nan,
+                **sample_stats(samples, errors),
+                'Errors': errors,
+                'Samples': samples,
+                'Phases': stats.get('phases') or {},
+                # Début de la mesure côté sonde si connu (les échantillons précèdent le retour SSH)
+                'Timestamp': datetime.fromtimestamp(stats['started_at']) if stats.get('started_at') else measured_at
+            })
+        return rows
+
+    async def test_all_regions(self, plan: Dict[str, Dict] = None) -> pd.DataFrame:
+        """Test toutes les régions en parallèle et compile les résultats
+        (plan : endpoints et volumes par région de AdaptiveSampler, régions absentes ignorées)"""
+        all_results = []
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        tasks = {}
+        for region, ip in self.instances.items():
+            if not self._region_endpoints(region) or (plan is not None and region not in plan):
+                continue
+            endpoints = self._region_endpoints(region) if plan is None else plan[region]['endpoints']
+            payload = self._probe_payload(endpoints, self._region_feeds(region, endpoints))
+            if plan is not None:
+                payload['sample_counts'] = plan[region]['sample_counts']
+            # Test distant (depuis l'instance)
+            tasks[region] = self._test_region_bounded(semaphore, region, ip, payload)
+
+        # La durée d'une mesure est celle de la région la plus lente, pas la somme
+        outcomes = await asyncio.gather(*tasks.values())
+        for region, (remote_results, measured_at) in zip(tasks.keys(), outcomes):
+            all_results.extend(self._rows_from_results(region, remote_results, measured_at))
+
+        return pd.DataFrame(all_results)
+
+    async def stream_region(self, region: str, ip: str, interval: float,
+                            on_rows: Callable[[pd.DataFrame], None], stop: asyncio.Event,
+                            replan: Callable[[str], Dict[str, int]] = None):
+        """Lance la sonde distante en mode agent et consomme son flux NDJSON jusqu'à `stop` ;
+        `replan(region)` renvoie les volumes par clé envoyés à l'agent après chaque mesure reçue"""
+        endpoints = self._region_endpoints(region)
+        payload = self._probe_payload(endpoints, self._region_feeds(region, endpoints))
+        backoff = 1.0
+        while not stop.is_set():
+            self._set_health(region, "ssh")
+            if not await self._wait_for_ssh(ip):
+                self._set_health(region, "erreur")
+                return
+            proc = await asyncio.create_subprocess_exec(
+                "ssh", *self.ssh_opts, f"root@{ip}", f"python3 /root/latency_test.py --agent {interval}",
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                start_new_session=True,
+            )
+            stderr_tail = deque(maxlen=5)
+
+            async def drain_stderr():
+                async for raw in proc.stderr:
+                    stderr_tail.append(raw.decode(errors="replace").strip())
+
+            async def close_on_stop():
+                # Fermer stdin demande à l'agent de s'arrêter proprement
+                await stop.wait()
+                if proc.stdin and not proc.stdin.is_closing():
+                    proc.stdin.close()
+
+            side_tasks = [asyncio.create_task(drain_stderr()), asyncio.create_task(close_on_stop())]
+            try:
+                # Les endpoints ne sont transmis qu'une fois, à l'ouverture du canal ; ensuite seulement les volumes
+                if replan:
+                    payload['sample_counts'] = replan(region)
+                proc.stdin.write((json.dumps(payload) + "\n").encode())
+                await proc.stdin.drain()
+                async for raw in proc.stdout:
+                    with TRACER.span('parse', region=region, bytes=len(raw)) as span:
+                        try:
+                            message = json.loads(raw)
+                        except json.JSONDecodeError:
+                            span.set('error')
+                            logger.debug(f"Ligne agent invalide ({region}): {raw[:200]!r}")
+                            continue
+                        measured_at = datetime.fromtimestamp(message.get('ts', time.time()))
+                        rows = self._rows_from_results(region, message.get('results', {}), measured_at)
+                    self._set_health(region, "streaming", data=True)
+                    if rows:
+                        on_rows(pd.DataFrame(rows))
+                    if replan and not proc.stdin.is_closing():
+                        proc.stdin.write((json.dumps({'sample_counts': replan(region)}) + "\n").encode())
+                        await proc.stdin.drain()
+                    backoff = 1.0
+                await proc.wait()
+            except (BrokenPipeError, ConnectionResetError) as e:
+                logger.error(f"Canal agent interrompu sur {ip}: {e}")
+            finally:
+                if proc.returncode is None:
+                    os.killpg(proc.pid, signal.SIGKILL)
+                    await proc.wait()
+                for task in side_tasks:
+                    task.cancel()
+            if stop.is_set():
+                break
+            logger.error(f"Agent terminé sur {ip} ({region}): code={proc.returncode} stderr={' | '.join(stderr_tail)}")
+            self._set_health(region, "reconnexion")
+            self._ssh_ready.discard(ip)
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+    async def stream_all_regions(self, duration_s: float, interval: float,
+                                 on_rows: Callable[[pd.DataFrame], None], stop_when: Callable[[], bool] = None,
+                                 replan: Callable[[str], Dict[str, int]] = None):
+        """Mode agent : un canal SSH persistant par région pendant `duration_s` secondes
+        (ou jusqu'à ce que `stop_when()` soit vrai, vérifié à chaque intervalle)"""
+        stop = asyncio.Event()
+        tasks = []
+        for region, ip in self.instances.items():
+            if self._region_endpoints(region):
+                print(f"\n📡 Agent démarré depuis {region_name(region)} ({region})...")
+                tasks.append(asyncio.create_task(self.stream_region(region, ip, interval, on_rows, stop, replan)))
+        if not tasks:
+            return
+        deadline = time.monotonic() + duration_s
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, _ = await asyncio.wait(tasks, timeout=min(remaining, interval) if stop_when else remaining)
+            if len(done) == len(tasks) or (stop_when and stop_when()):
+                break
+        stop.set()
+        # Laisser les agents finir leur mesure en cours, puis couper
+        _, pending = await asyncio.wait(tasks, timeout=max(10.0, interval * 2))
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+def print_report(summary_df: pd.DataFrame):
+    """Affiche les pivots par région et le Top 10, séparément pour chaque méthode de mesure"""
+    # Helpers pour coloration ANSI
+    ANSI_RESET = "\033[0m"
+    ANSI_GREEN = "\033[92m"
+    ANSI_ORANGE = "\033[33m"  # approximation d'orange
+    ANSI_RED = "\033[91m"
+
+    def colorize_latency(value: float) -> str:
+        if pd.isna(value):
+            return "-"
+        try:
+            v = float(value)
+        except Exception:
+            return str(value)
+        if v < LATENCY_GREEN_MS:
+            color = ANSI_GREEN
+        elif v <= LATENCY_ORANGE_MS:
+            color = ANSI_ORANGE
+        else:
+            color = ANSI_RED
+        return f"{color}{v:.2f}{ANSI_RESET}"
+
+    if summary_df.empty:
+        print("\n⚠️  Aucun résultat agrégé à afficher.")
+        print("\n🏆 Top 10 meilleures latences:")
+        print("⚠️  Aucun résultat disponible pour un Top 10.")
+        return
+
+    # Les pivots et le Top 10 portent sur l'adresse choisie par le résolveur ; les edges ont leur propre tableau
+    edges_df = summary_df[summary_df['Edge IP'] != '']
+    resolver_df = summary_df[summary_df['Edge IP'] == '']
+
+    method_titles = {'http': "", 'tcp': " — connexion TCP", 'tls': " — connexion TCP + handshake TLS",
+                     'clock': " — endpoint d'heure serveur",
+                     'ws': " — fraîcheur du flux WebSocket (réception - heure d'événement)"}
+    for method, method_df in resolver_df.groupby('Method', sort=False):
+        suffix = method_titles.get(method, f" — {method}")
+
+        # Tableaux récapitulatifs par région (p50 et p99)
+        pivots = [('p50 (ms)', f"📈 Latences p50 (ms){suffix}:"), ('p99 (ms)', f"📈 Latences p99 (ms){suffix}:")]
+        if method_df['Warm TTFB p50 (ms)'].notna().any():
+            pivots.append(('Warm TTFB p50 (ms)', "📈 TTFB à chaud p50 (ms) — hors DNS/connexion/TLS/corps:"))
+        for column, title in pivots:
+            if not method_df[column].notna().any():
+                print(f"\n{title}\n⚠️  Aucune mesure réussie.")
+                continue
+            pivot_table = method_df.pivot_table(
+                values=column,
+                index='Exchange',
+                columns='Region',
+                aggfunc='mean'
+            ).round(2)
+            print(f"\n{title}")
+            colored_pivot = pivot_table.applymap(colorize_latency)
+            print(colored_pivot.to_string())
+
+        # Top 10 meilleures latences (p50 total, ou TTFB à chaud avec RANK_METRIC=warm_ttfb)
+        rank_column = 'Warm TTFB p50 (ms)' if RANK_METRIC == "warm_ttfb" and method == 'http' else 'p50 (ms)'
+        print(f"\n🏆 Top 10 meilleures latences ({rank_column}{suffix}):")
+        if method_df[rank_column].notna().any():
+            best_latencies = method_df.nsmallest(10, rank_column)
+            required_cols = ['Region', 'Exchange', 'Type', 'Count'] + STAT_COLUMNS
+            if method == 'http':
+                required_cols += ['Warm TTFB p50 (ms)', 'Cold p50 (ms)']
+                best_latencies, phase_cols = http_phase_columns(best_latencies)
+                required_cols += phase_cols
+            elif method == 'ws':
+                required_cols += [column for phase in WS_PHASES for column in PHASE_COLUMNS[phase]]
+                required_cols.append('Skewed samples')
+            print(best_latencies[required_cols].to_string(index=False))
+        else:
+            print("⚠️  Aucun résultat disponible pour un Top 10.")
+        if method == 'ws' and (method_df['Skewed samples'] > 0).any():
+            # Un flux dont toutes les fraîcheurs sont <= 0 n'a aucun échantillon : le décalage en est la cause
+            skewed = method_df[method_df['Skewed samples'] > 0]
+            print(f"⚠️  Fraîcheurs <= 0 écartées (horloge de l'instance en retard sur l'exchange, NTP ?) "
+                  f"pour {len(skewed)} flux:")
+            print(skewed[['Region', 'Exchange', 'Count', 'Skewed samples']].to_string(index=False))
+
+    if (resolver_df.groupby(['Exchange', 'Method'])['Region'].nunique() > 1).any():
+        print_best_regions(resolver_df)
+    if not edges_df.empty:
+        print_fastest_edges(edges_df, resolver_df)
+    if resolver_df['Clock offset (ms)'].notna().any():
+        print_one_way(resolver_df)
+
+
+def http_phase_columns(df: pd.DataFrame) -> Tuple[pd.DataFrame, List[str]]:
+    """Colonnes de phases renseignées ; la sonde aiohttp n'a pas de hook TLS : sa connexion inclut le
+    handshake, la colonne est alors renommée Connect+TLS plutôt que d'afficher un TLS vide"""
+    columns = [column for column in ('DNS p50 (ms)', 'Connect p50 (ms)', 'TLS p50 (ms)', 'Body p50 (ms)')
+               if df[column].notna().any()]
+    if 'Connect p50 (ms)' in columns and 'TLS p50 (ms)' not in columns:
+        print("ℹ️  Pas de mesure TLS séparée (sonde aiohttp, sans hook TLS): Connect+TLS = TCP + handshake TLS "
+              "(TLS seul: BOOT_PROFILE=fast, ou écart des pings tls et tcp)")
+        df = df.rename(columns={'Connect p50 (ms)': 'Connect+TLS p50 (ms)'})
+        columns[columns.index('Connect p50 (ms)')] = 'Connect+TLS p50 (ms)'
+    return df, columns
+
+
+def print_best_regions(resolver_df: pd.DataFrame):
+    """Meilleur datacenter (et son suivant) pour chaque exchange mesuré depuis plusieurs régions"""
+    print("\n🗺️  Meilleure région par exchange (p50):")
+    rows = []
+    measured = resolver_df[resolver_df['p50 (ms)'].notna()]
+    for (exchange, method), group in measured.groupby(['Exchange', 'Method'], sort=True):
+        ranked = group.nsmallest(2, 'p50 (ms)')
+        best = ranked.iloc[0]
+        runner_up = ranked.iloc[1] if len(ranked) > 1 else None
+        rows.append({
+            'Exchange': exchange,
+            'Method': method,
+            'Best region': best['Region'],
+            'p50 (ms)': best['p50 (ms)'],
+            'p99 (ms)': best['p99 (ms)'],
+            'Regions': len(group),
+            'Runner-up': runner_up['Region'] if runner_up is not None else '-',
+            'Runner-up p50 (ms)': runner_up['p50 (ms)'] if runner_up is not None else math.nan,
+        })
+    if rows:
+        print(pd.DataFrame(rows).to_string(index=False))
+    else:
+        print("⚠️  Aucune mesure réussie.")
+
+
+def print_fastest_edges(edges_df: pd.DataFrame, resolver_df: pd.DataFrame):
+    """Edge (adresse IP) le plus rapide par région, exchange et méthode, comparé à l'adresse du résolveur.
+
+    La référence doit venir du même client que les edges : en http, les edges passent par le client stdlib
+    et sont comparés à la ligne 'resolver' (adresse du résolveur via ce client), jamais à la mesure aiohttp ;
+    les pings tcp/tls suivent le même chemin avec ou sans edge, la mesure du résolveur sert alors de référence"""
+    print("\n🌐 Edge le plus rapide par région (p50, IP à épingler dans le résolveur):")
+    is_baseline = edges_df['Edge IP'] == 'resolver'
+    candidates = edges_df[~is_baseline]
+    measured = candidates[candidates['p50 (ms)'].notna()]
+    if measured.empty:
+        print("⚠️  Aucune mesure réussie sur les edges.")
+        return
+    group_columns = ['Region', 'Exchange', 'Method']
+    baseline = pd.concat([resolver_df[resolver_df['Method'] != 'http'], edges_df[is_baseline]])
+    fastest = measured.loc[measured.groupby(group_columns)['p50 (ms)'].idxmin()]
+    fastest = fastest.merge(
+        candidates.groupby(group_columns).size().rename('Edges').reset_index(), on=group_columns
+    ).merge(
+        baseline[group_columns + ['p50 (ms)']].rename(columns={'p50 (ms)': 'Resolver p50 (ms)'}),
+        on=group_columns, how='left'
+    )
+    fastest['Gain (ms)'] = (fastest['Resolver p50 (ms)'] - fastest['p50 (ms)']).round(2)
+    columns = group_columns + ['Edge IP', 'Edges', 'p50 (ms)', 'p99 (ms)', 'Error rate (%)',
+                               'Resolver p50 (ms)', 'Gain (ms)']
+    print(fastest.sort_values(group_columns)[columns].to_string(index=False))
+
+
+def print_one_way(resolver_df: pd.DataFrame):
+    """Latences aller simple (envoi d'ordre / réception de données) et décalage d'horloge par région et exchange"""
+    print("\n⏱️  Latence aller simple (p50, horloges supposées synchronisées) — tri par envoi d'ordre:")
+    measured = resolver_df[resolver_df['Clock offset (ms)'].notna()]
+    columns = ['Region', 'Exchange', 'Method', 'One-way up p50 (ms)', 'One-way down p50 (ms)', 'p50 (ms)'] \
+        + CLOCK_COLUMNS[:2]
+    print(measured.sort_values(['One-way up p50 (ms)', 'Region'], na_position='last')[columns]
+          .to_string(index=False))
+    # Un décalage supérieur à son incertitude signale une horloge locale ou serveur non synchronisée
+    skewed = measured[measured['Clock offset (ms)'].abs() > measured['Clock ± (ms)']]
+    if not skewed.empty:
+        print(f"⚠️  Décalage d'horloge supérieur au demi-RTT pour {len(skewed)} paire(s) : aller simple à prendre "
+              f"avec prudence (NTP/chrony actif sur l'instance ?)")
+
+
+def analyze_history(index: pd.DataFrame, metric: str = 'p50', threshold_pct: float = ANALYZE_REGRESSION_PCT,
+                    min_segment: int = ANALYZE_MIN_SEGMENT) -> Dict[str, pd.DataFrame]:
+    """Tendances, ruptures (CUSUM) et régressions par clé sur l'index des runs, sans boucle Python par ligne"""
+    keys = list(LatencyAggregator.KEY_COLUMNS)
+    df = index[index[metric].notna()].sort_values(keys + ['start'], kind='stable').reset_index(drop=True)
+    if df.empty:
+        return {'trends': df, 'change_points': df, 'regressions': df}
+    groups = df.groupby(keys, observed=True, sort=False)
+    x = df[metric]
+    n = groups[metric].transform('size')
+    rank = groups.cumcount() + 1
+
+    # Tendance : pente des moindres carrés (ms/jour) à partir de sommes par groupe
+    days = (df['start'] - groups['start'].transform('min')).dt.total_seconds() / 86400.0
+    sums = pd.DataFrame({'t': days, 'y': x, 'tt': days * days, 'ty': days * x}).groupby(
+        [df[key] for key in keys], observed=True).sum()
+    counts = groups.size()
+    variance = sums['tt'] - sums['t'] ** 2 / counts
+    slope = (sums['ty'] - sums['t'] * sums['y'] / counts) / variance.where(variance > 0)
+    last = df[rank == n].set_index(keys)
+    trends = pd.DataFrame({
+        'Runs': counts,
+        f'First {metric} (ms)': groups[metric].first(),
+        f'Last {metric} (ms)': last[metric],
+        'Slope (ms/day)': slope,
+    }).reset_index()
+
+    # Rupture : maximum de |CUSUM| des écarts à la moyenne ; moyennes avant/après par sommes cumulées
+    mean = groups[metric].transform('mean')
+    cusum = (x - mean).groupby([df[key] for key in keys], observed=True).cumsum()
+    running = x.groupby([df[key] for key in keys], observed=True).cumsum()
+    total = groups[metric].transform('sum')
+    before = running / rank
+    after = (total - running) / (n - rank).where(n > rank)
+    # Écart-type intra-segments poolé de chaque coupure (sommes des carrés cumulées) : l'écart-type de la
+    # série entière contient la rupture testée et plafonne t à sqrt(n - 1)
+    running_sq = (x * x).groupby([df[key] for key in keys], observed=True).cumsum()
+    total_sq = groups[metric].transform(lambda values: (values * values).sum())
+    within = (running_sq - running * running / rank
+              + (total_sq - running_sq) - (total - running) ** 2 / (n - rank).where(n > rank)).clip(lower=0)
+    pooled = np.sqrt(within / (n - 2).where(n > 2))
+    spread = pooled * np.sqrt(1.0 / rank + 1.0 / (n - rank).where(n > rank))
+    candidates = df.assign(
+        _score=cusum.abs(), _before=before, _after=after, _t=(after - before).abs() / spread, _n=n,
+        _next=groups['start'].shift(-1), _next_run=groups['run_id'].shift(-1),
+    )[(rank >= min_segment) & (n - rank >= min_segment)]
+    best = candidates.sort_values('_score', ascending=False, kind='stable').drop_duplicates(keys)
+    change_points = pd.DataFrame({
+        **{key: best[key] for key in keys},
+        'Since run': best['_next_run'],
+        'Since': best['_next'],
+        f'Before {metric} (ms)': best['_before'].round(2),
+        f'After {metric} (ms)': best['_after'].round(2),
+        'Shift (%)': ((best['_after'] - best['_before']) / best['_before'] * 100).round(1),
+        't': best['_t'].round(1),
+    })
+    change_points = change_points[(change_points['Shift (%)'].abs() >= threshold_pct)
+                                  & (change_points['t'] >= ANALYZE_MIN_T)]
+
+    # Régression : dernier run contre la médiane des runs précédents
+    baseline = df[rank < n].groupby(keys, observed=True)[metric].median()
+    regressions = pd.DataFrame({
+        'Run': last['run_id'],
+        f'Baseline {metric} (ms)': baseline,
+        f'Last {metric} (ms)': last[metric],
+    }).dropna(subset=[f'Baseline {metric} (ms)'])
+    regressions['Change (%)'] = ((regressions[f'Last {metric} (ms)'] - regressions[f'Baseline {metric} (ms)'])
+                                 / regressions[f'Baseline {metric} (ms)'] * 100).round(1)
+    regressions = regressions[regressions['Change (%)'] >= threshold_pct].round(2).reset_index()
+    return {
+        'trends': trends.round(3),
+        'change_points': change_points.sort_values('Shift (%)', ascending=False).reset_index(drop=True),
+        'regressions': regressions.sort_values('Change (%)', ascending=False).reset_index(drop=True),
+    }
+
+
+def analyze_main(argv: List[str]) -> int:
+    """Sous-commande `analyze` : historique des runs du store ; code de sortie 1 si une régression est détectée"""
+    import argparse
+    from datetime import timedelta
+    parser = argparse.ArgumentParser(prog="latency-multi-geo.py analyze",
+                                     description="Tendances, ruptures et régressions sur l'historique des runs")
+    parser.add_argument("--exchange", help="filtrer sur un exchange")
+    parser.add_argument("--region", help="filtrer sur une région (nom, ex. Frankfurt)")
+    parser.add_argument("--method", default="http", help="méthode de mesure (http, tcp, tls ; défaut http)")
+    parser.add_argument("--days", type=float, help="ne garder que les runs des N derniers jours")
+    parser.add_argument("--metric", choices=["p50", "p90", "p99"], default="p50")
+    parser.add_argument("--threshold", type=float, default=ANALYZE_REGRESSION_PCT,
+                        help="seuil de régression/rupture en %% (défaut %(default)s)")
+    parser.add_argument("--min-segment", type=int, default=ANALYZE_MIN_SEGMENT,
+                        help="runs minimum de part et d'autre d'une rupture (défaut %(default)s)")
+    parser.add_argument("--top", type=int, default=10, help="lignes affichées par tableau")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    store = ResultsStore()
+    index = store.summary_index()
+    if index.empty:
+        print("⚠️  Store vide: lancez un test ou importez des CSV (import-csv).")
+        return 0
+    mask = (index['Method'] == args.method) & (index['Edge IP'] == '')
+    if args.exchange:
+        mask &= index['Exchange'] == args.exchange
+    if args.region:
+        mask &= index['Region'] == args.region
+    if args.days:
+        mask &= index['start'] >= datetime.now() - timedelta(days=args.days)
+    results = analyze_history(index[mask], args.metric, args.threshold, args.min_segment)
+    elapsed = time.perf_counter() - started
+
+    runs = index.loc[mask, 'run_id'].nunique()
+    print(f"📚 {runs} run(s), {int(index.loc[mask, 'samples'].sum())} échantillons, "
+          f"{mask.sum()} résumé(s) (région, exchange, run) analysés en {elapsed * 1000:.0f} ms")
+    trends = results['trends']
+    print(f"\n📈 Tendances {args.metric} (pentes les plus fortes):")
+    if trends.empty:
+        print("⚠️  Pas assez de runs.")
+    else:
+        print(trends.sort_values('Slope (ms/day)', ascending=False, na_position='last').head(args.top)
+              .to_string(index=False))
+    print(f"\n🔀 Ruptures {args.metric} (CUSUM, |écart| ≥ {args.threshold:g} %):")
+    if results['change_points'].empty:
+        print("  Aucune rupture détectée.")
+    else:
+        print(results['change_points'].head(args.top).to_string(index=False))
+    print(f"\n🚨 Régressions du dernier run (≥ +{args.threshold:g} % vs médiane des runs précédents):")
+    if results['regressions'].empty:
+        print("  ✅ Aucune régression.")
+    else:
+        print(results['regressions'].head(args.top).to_string(index=False))
+    return 1 if not results['regressions'].empty else 0
+
+
+# Codes de sortie de run/destroy (analyze renvoie 1 sur régression, argparse 2 sur erreur d'usage)
+EXIT_OK = 0
+EXIT_NO_DATA = 1
+EXIT_USAGE = 2
+EXIT_PARTIAL = 3
+EXIT_TEARDOWN_FAILED = 4
+
+
+async def main(regions: List[str] = None, minutes: float = None, destroy: str = "auto",
+               output: str = None) -> int:
+    """Déploie, mesure, rapporte et détruit. Sans minutes ni terminal, aucune question n'est posée
+    (durée par défaut 5 min, destruction automatique) ; renvoie un code EXIT_*"""
+    print("🚀 Démarrage du déploiement Vultr multi-région...")
+    interactive = sys.stdin.isatty()
+    
+    # Initialiser le deployer
+    deployer = VultrDeployer(VULTR_API_KEY)
+    
+    # Sélectionner les régions à déployer
+    regions_to_deploy = list(regions or DEPLOY_REGIONS)
+    matrix = None
+    if MATRIX_MODE:
+        # Matrice complète : union des endpoints x régions disponibles pour le plan, shardée par instance
+        available = deployer.get_available_regions()
+        REGION_NAMES.update({code: region.get('city', code) for code, region in available.items()})
+        regions = [code for code in sorted(available) if not MATRIX_REGIONS or code in MATRIX_REGIONS]
+        shards = shard_endpoints(matrix_endpoints(), MATRIX_SHARDS)
+        matrix = {shard_slot(region, index): shard for region in regions for index, shard in enumerate(shards)}
+        regions_to_deploy = list(matrix)
+        print(f"\n🧮 Mode matrice: {sum(map(len, shards))} endpoints x {len(regions)} régions "
+              f"sur {len(regions_to_deploy)} instances")
+    instances_ips: Dict[str, str] = {}
+    # Début de facturation (création ou adoption) par région, pour le coût réel en instance-minutes
+    billing_started: Dict[str, float] = {}
+
+    # Pool d'instances : détruire les instances expirées puis réutiliser les instances saines
+    pool = InstancePool() if INSTANCE_POOL else None
+    # Instances suivies par le pool pour ce run (adoptées ou enregistrées) : les autres sont détruites en fin de run
+    pooled_ids = set()
+    if pool:
+        deployer.tags.append(POOL_TAG)
+        reaped = pool.reap(deployer)
+        if reaped:
+            print(f"\n♻️  {len(reaped)} instance(s) inactive(s) du pool détruite(s) (TTL {POOL_TTL_MINUTES:g} min)")
+        adopted = pool.adopt(deployer, regions_to_deploy)
+        if adopted:
+            healthy = await LatencyTester({}).check_pool_instances(adopted)
+            pool.mark_probe_installed([record['id'] for record in healthy.values()])
+            unhealthy = {region: record['id'] for region, record in adopted.items() if region not in healthy}
+            if unhealthy:
+                logger.error(f"Instances du pool en échec de health check, destruction: {unhealthy}")
+                deployer.destroy_instances(unhealthy)
+                pool.forget(list(unhealthy.values()))
+            for region, record in healthy.items():
+                deployer.instances[region] = record['id']
+                pooled_ids.add(record['id'])
+                TRACER.instance_up(record['id'])
+                instances_ips[region] = record['ip']
+                billing_started[region] = time.time()
+                print(f"  ♻️  Instance du pool réutilisée dans {region}: {record['id']} ({record['ip']})")
+
+    missing_regions = [region for region in regions_to_deploy if region not in instances_ips]
+    if missing_regions:
+        print(f"\n📍 Déploiement dans {len(missing_regions)} régions...")
+        
+        # Créer les instances (en parallèle)
+        created_at = time.time()
+        created = deployer.create_instances(missing_regions)
+        billing_started.update({region: created_at for region, instance_id in created.items() if instance_id})
+        for region, instance_id in created.items():
+            if instance_id:
+                print(f"  ✓ Instance créée dans {region}: {instance_id}")
+            else:
+                print(f"  ✗ Échec création dans {region}")
+        
+        # Attendre que les instances soient prêtes
+        print("\n⏳ Attente du démarrage des instances (2-3 minutes)...")
+        ready = deployer.wait_for_instances(instances=created)
+        if pool:
+            for region, ip in ready.items():
+                pool.register(region, created[region], ip)
+                pooled_ids.add(created[region])
+        instances_ips.update(ready)
+    
+    # Choix de la durée de test (question seulement en interactif sans --duration)
+    if minutes is not None:
+        test_minutes = minutes
+    elif interactive:
+        print("\n⏲️  Sélectionnez la durée du test: 0 (single pass), 1, 5, 15, 60 minutes (1h) — Entrée pour 5 par défaut")
+        duration_choice = input("Durée (min) [0/1/5/15/60/1h]: ").strip().lower()
+        valid_choices = {"": 5, "0": 0, "1": 1, "1m": 1, "5": 5, "15": 15, "60": 60, "1h": 60, "h": 60}
+        test_minutes = valid_choices.get(duration_choice, 5)
+    else:
+        test_minutes = 5
+    if test_minutes == 0:
+        print("⏳ Single-pass test (one iteration per geography)...")
+    elif ADAPTIVE_SAMPLING:
+        print(f"⏳ Test adaptatif: arrêt à convergence (IC ±{ADAPTIVE_CI_TARGET:.0%} sur p50/p99), "
+              f"au plus {test_minutes} minutes...")
+    else:
+        print(f"⏳ Test en cours pour {test_minutes} minutes...")
+
+    # Tester les latences sur la durée choisie
+    tester = LatencyTester(instances_ips, endpoints=matrix)
+    # Chaque mesure est agrégée et écrite sur disque dès son arrivée (rien n'est gardé en mémoire)
+    aggregator = LatencyAggregator()
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    # --output: fichier .csv, sinon dossier du store Parquet
+    csv_output = RESULTS_FORMAT != "parquet" or (output or "").endswith(".csv")
+    out_file = output if output and csv_output else f"vultr_latency_test_{timestamp}_{test_minutes:g}m.csv"
+    store = None
+    if not csv_output:
+        try:
+            store = ResultsStore(output or RESULTS_STORE_PATH)
+        except ImportError:
+            logger.error("pyarrow introuvable: résultats écrits en CSV (pip install pyarrow)")
+
+    def record_round(run_df: pd.DataFrame):
+        if run_df.empty:
+            return
+        with TRACER.span('aggregate', rows=len(run_df)):
+            aggregator.add_frame(run_df)
+            TRACER.observe_rows(run_df)
+            if store:
+                store.append(run_df, timestamp)
+            else:
+                run_df.assign(Samples=run_df['Samples'].map(json.dumps), Phases=run_df['Phases'].map(json.dumps)).to_csv(
+                    out_file, mode='a', header=not os.path.exists(out_file), index=False
+                )
+        TRACER.write_metrics()
+
+    dashboard = LiveDashboard(aggregator, tester) if LIVE_DASHBOARD else None
+    if dashboard:
+        dashboard.start()
+
+    # Fin de cloud-init attendue une fois pour toutes : les régions non prêtes sont un échec de boot, pas de mesure
+    with TRACER.span('boot_ready', instances=len(instances_ips)) as span:
+        boot_failed = await tester.wait_for_boot()
+        if boot_failed:
+            span.set('error', failed=len(boot_failed))
+    if boot_failed:
+        print(f"\n❌ Boot non terminé après {BOOT_TIMEOUT:.0f}s (cloud-init): {', '.join(boot_failed)} — régions exclues des mesures")
+        tester.instances = {region: ip for region, ip in instances_ips.items() if region not in boot_failed}
+
+    sampler = AdaptiveSampler(aggregator, {
+        region: tester._region_endpoints(region) for region in tester.instances if tester._region_endpoints(region)
+    }) if ADAPTIVE_SAMPLING else None
+    # finished : plus rien à mesurer avant la fin du temps imparti ; converged : en plus, toutes les paires dans l'IC visé
+    finished = converged = False
+
+    if test_minutes == 0:
+        # Single pass
+        try:
+            with TRACER.span('iteration', iteration=1):
+                record_round(await tester.test_all_regions())
+        except Exception as e:
+            logger.error(f"Erreur pendant la mesure unique: {e}")
+    elif AGENT_MODE:
+        # Agents persistants : une session SSH par région, mesures toutes les AGENT_INTERVAL secondes
+        print(f"📡 Mode agent: une mesure toutes les {AGENT_INTERVAL:g}s par région")
+        await tester.stream_all_regions(test_minutes * 60, AGENT_INTERVAL, record_round,
+                                        stop_when=sampler.finished if sampler else None,
+                                        replan=sampler.region_counts if sampler else None)
+        finished = bool(sampler) and sampler.finished()
+        converged = finished and sampler.converged()
+    elif sampler:
+        # Mesures enchaînées sans pause : seules les paires non convergées sont encore mesurées
+        start_ts = time.time()
+        iteration = 0
+        while time.time() - start_ts < test_minutes * 60:
+            plan = sampler.plan()
+            if not plan:
+                finished = True
+                converged = sampler.converged()
+                break
+            iteration += 1
+            print(f"\n📊 Mesure adaptative {iteration}: {sampler.pending} paire(s) à affiner, "
+                  f"{sampler.requested} échantillons demandés...")
+            try:
+                with TRACER.span('iteration', iteration=iteration, pending=sampler.pending):
+                    record_round(await tester.test_all_regions(plan))
+            except Exception as e:
+                logger.error(f"Erreur pendant la mesure {iteration}: {e}")
+                await asyncio.sleep(30)
+        else:
+            finished = sampler.finished()
+            converged = finished and sampler.converged()
+    else:
+        start_ts = time.time()
+        iteration = 0
+        while time.time() - start_ts < test_minutes * 60:
+            iteration += 1
+            print(f"\n📊 Mesure {iteration}...")
+            try:
+                with TRACER.span('iteration', iteration=iteration):
+                    record_round(await tester.test_all_regions())
+            except Exception as e:
+                logger.error(f"Erreur pendant la mesure {iteration}: {e}")
+            await asyncio.sleep(30)  # intervalle entre mesures
+
+    if dashboard:
+        await dashboard.stop()
+    if converged:
+        print("\n🎯 Toutes les paires ont convergé: fin anticipée des mesures.")
+    elif sampler:
+        unconverged = sampler.unconverged_frame()
+        if finished:
+            print(f"\n⚠️  Mesures arrêtées sans convergence complète (budget de {sampler.max_samples} tentatives "
+                  f"par paire, ADAPTIVE_MAX_SAMPLES):")
+        else:
+            print("\n⚠️  Durée écoulée avant convergence:")
+        print(f"{len(unconverged)} paire(s) hors de l'IC visé (±{sampler.ci_target:.0%} ou {sampler.ci_floor_ms:g} ms):")
+        print(unconverged.to_string(index=False) if not unconverged.empty else "-")
+    
+    # Agréger et afficher les résultats
+    print("\n" + "="*80)
+    print("RÉSULTATS DES TESTS DE LATENCE")
+    print("="*80)
+
+    # Statistiques par (région, exchange, méthode) depuis l'état agrégé
+    with TRACER.span('report'):
+        print_report(aggregator.summary_frame())
+    
+    # Résultats déjà écrits au fil des mesures (un échantillon brut par mesure, sérialisé en JSON)
+    if store and timestamp in store.runs():
+        store.compact(timestamp)
+        # Résumé du run ajouté à l'index de l'analyse historique
+        store.summary_index()
+        print(f"\n💾 Résultats ajoutés au store: {store.root} (run {timestamp})")
+    elif os.path.exists(out_file):
+        print(f"\n💾 Résultats sauvegardés: {out_file}")
+    else:
+        print("\n⚠️  Aucun résultat à sauvegarder.")
+    
+    # Destruction des instances
+    def destroy_all(instances: Dict[str, str] = None) -> bool:
+        instances = deployer.instances if instances is None else instances
+        results = deployer.destroy_instances(instances)
+        for region, destroyed in results.items():
+            if destroyed:
+                print(f"  ✓ Instance {region} détruite")
+            else:
+                print(f"  ✗ Erreur destruction {region}")
+        if pool:
+            pool.forget([instances[region] for region, destroyed in results.items() if destroyed])
+        return all(results.values())
+
+    def release_pool(message: str, keep_strays: bool = False) -> bool:
+        # Baux rendus au pool ; les instances hors pool (jamais prêtes, donc non enregistrées) sont détruites
+        pool.release()
+        print(f"\n♻️  {message}: instances rendues au pool (détruites après {POOL_TTL_MINUTES:g} min d'inactivité)")
+        strays = {region: instance_id for region, instance_id in deployer.instances.items()
+                  if instance_id not in pooled_ids}
+        if not strays:
+            return True
+        if keep_strays:
+            print(f"⚠️  Instances hors pool conservées: {', '.join(strays)} (destroy --label-prefix arb-test- pour les supprimer).")
+            return True
+        print(f"🗑️  Destruction des {len(strays)} instance(s) hors pool...")
+        return destroy_all(strays)
+
+    # Option 0, convergence atteinte ou budget épuisé : pas de question, les instances ne servent plus
+    reason = "Convergence atteinte" if converged else "Budget épuisé" if finished else "Option 0"
+    torn_down = True
+    if destroy == "always":
+        print("\n🗑️  --destroy always: destruction des instances...")
+        torn_down = destroy_all()
+    elif destroy == "keep" and pool:
+        torn_down = release_pool("--destroy keep", keep_strays=True)
+    elif destroy == "keep":
+        print("\n⚠️  --destroy keep: instances conservées (destroy --label-prefix arb-test- pour les supprimer).")
+    elif (test_minutes == 0 or finished or not interactive) and pool:
+        torn_down = release_pool(f"{reason} avec pool" if test_minutes == 0 or finished else "Sans terminal, avec pool")
+    elif test_minutes == 0 or finished:
+        print(f"\n🗑️  {reason}: destruction immédiate des instances...")
+        torn_down = destroy_all()
+    elif not interactive:
+        print("\n🗑️  Sans terminal: destruction automatique des instances...")
+        torn_down = destroy_all()
+    else:
+        # Demander si on détruit les instances (auto 'y' après 30s)
+        prompt = "\n🗑️  Détruire les instances de test? (y/n) [auto 'y' après 30s]: "
+        try:
+            answer = await asyncio.wait_for(asyncio.to_thread(input, prompt), timeout=30)
+        except asyncio.TimeoutError:
+            print("⏱️  Pas de réponse après 30s, destruction automatique des instances...")
+            answer = 'y'
+
+        if answer.lower() == 'y':
+            torn_down = destroy_all()
+        elif pool:
+            torn_down = release_pool("Instances conservées")
+        else:
+            print("  ⚠️  Instances conservées à votre demande.")
+
+    # Calculer les coûts sur les instance-minutes réellement consommées (création/adoption -> fin)
+    print("\n💰 Estimation des coûts:")
+    now = time.time()
+    instance_minutes = sum(now - started for started in billing_started.values()) / 60.0
+    print(f"  - Test ({instance_minutes:.1f} instance-minutes): ${VULTR_HOURLY_PRICE * instance_minutes / 60.0:.2f}")
+    print(f"  - Mensuel (si gardé): ${len(instances_ips) * 12:.2f}")
+
+    # Code de sortie : instances non détruites > aucune mesure réussie > régions sans mesure réussie
+    measured = {key[0] for key, entry in aggregator.entries.items() if entry.histogram.count}
+    missing = [region for region in regions_to_deploy if region_name(region) not in measured]
+    if not torn_down:
+        print("\n❌ Des instances n'ont pas pu être détruites (facturation en cours).")
+        return EXIT_TEARDOWN_FAILED
+    if not measured:
+        print("\n❌ Aucune mesure réussie.")
+        return EXIT_NO_DATA
+    if missing:
+        unbooted = [region for region in missing if region in boot_failed]
+        if unbooted:
+            print(f"\n⚠️  Instances jamais prêtes (boot > {BOOT_TIMEOUT:.0f}s): {', '.join(unbooted)}")
+        if len(unbooted) < len(missing):
+            print(f"\n⚠️  Test terminé sans mesure pour: {', '.join(r for r in missing if r not in boot_failed)}")
+        return EXIT_PARTIAL
+    print("\n✅ Test terminé!")
+    return EXIT_OK
+
+def import_csv_files(paths: List[str]):
+    """Importe des CSV de runs précédents dans le store Parquet"""
+    store = ResultsStore()
+    for path in paths:
+        rows = store.import_csv(path)
+        if rows:
+            print(f"  ✓ {path}: {rows} ligne(s) importée(s)")
+        else:
+            print(f"  - {path}: déjà présent ou vide")
+
+
+
+def print_plan(regions: List[str], minutes: float = None, destroy: str = "auto", output: str = None):
+    """--dry-run : régions, endpoints, paramètres et coût estimé du run, sans appel API"""
+    print("🧪 Dry-run: aucun appel API, aucune instance créée")
+    if MATRIX_MODE:
+        endpoints = matrix_endpoints()
+        scope = ", ".join(MATRIX_REGIONS) if MATRIX_REGIONS else "toutes les régions du plan (découvertes via l'API)"
+        print(f"\n🧮 Mode matrice: {len(endpoints)} endpoints x {scope}, {MATRIX_SHARDS} instance(s) par région")
+        instances = len(MATRIX_REGIONS) * MATRIX_SHARDS
+    else:
+        print(f"\n📍 {len(regions)} région(s):")
+        for region in regions:
+            config = REGION_EXCHANGE_MAP[region]
+            endpoints = {**config.get('cex', {}), **config.get('dex', {})}
+            feeds = f" + {len(config['ws'])} flux ws" if 'ws' in PROBE_METHODS and config.get('ws') else ""
+            print(f"  - {region} ({region_name(region)}): {len(endpoints)} endpoint(s){feeds} — {', '.join(endpoints)}")
+        instances = len(regions)
+    if INSTANCE_POOL:
+        print("♻️  Pool: instances libres réutilisées, seules les régions manquantes sont créées")
+
+    if minutes is None:
+        duration = "demandée au lancement (5 min sans terminal)"
+    else:
+        duration = "une passe" if minutes == 0 else f"{minutes:g} min"
+    if ADAPTIVE_SAMPLING and minutes:
+        duration += f", arrêt anticipé à convergence (IC ±{ADAPTIVE_CI_TARGET:.0%})"
+    print(f"\n📏 Méthodes: {', '.join(PROBE_METHODS)} · {PROBE_SAMPLES} échantillon(s) http par endpoint et par mesure")
+    print(f"⏲️  Durée: {duration}")
+    if RESULTS_FORMAT != "parquet" or (output or "").endswith(".csv"):
+        print(f"💾 Sortie: {output or 'vultr_latency_test_<horodatage>_<durée>m.csv'} (CSV)")
+    else:
+        print(f"💾 Sortie: store Parquet {output or RESULTS_STORE_PATH}")
+    print(f"🗑️  Destruction: {destroy}")
+    if instances and minutes is not None:
+        # Démarrage des instances compris (2-3 minutes)
+        instance_minutes = instances * (minutes + 3)
+        print(f"💰 Coût estimé: ~${VULTR_HOURLY_PRICE * instance_minutes / 60.0:.3f} "
+              f"({instances} instance(s) x {minutes + 3:g} min, démarrage compris)")
+
+
+def destroy_main(label_prefix: str = None, tag: str = None, dry_run: bool = False) -> int:
+    """Sous-commande destroy : détruit les instances dont le label commence par label_prefix et/ou portant tag"""
+    deployer = VultrDeployer(VULTR_API_KEY)
+    matched = {info['id']: info for info in deployer.list_instances(tag=tag)
+               if not label_prefix or info.get('label', '').startswith(label_prefix)}
+    if not matched:
+        print("✅ Aucune instance correspondante.")
+        return EXIT_OK
+    print(f"🗑️  {len(matched)} instance(s) correspondante(s):")
+    for info in matched.values():
+        print(f"  - {info.get('label') or '-'} {info['id']} ({info.get('region', '?')}, {info.get('main_ip', '-')})")
+    if dry_run:
+        print("🧪 Dry-run: aucune instance détruite.")
+        return EXIT_OK
+
+    results = deployer.destroy_instances({instance_id: instance_id for instance_id in matched})
+    destroyed = [instance_id for instance_id, ok in results.items() if ok]
+    for instance_id, ok in results.items():
+        print(f"  {'✓' if ok else '✗'} {matched[instance_id].get('label') or instance_id}")
+    # Le pool ne doit plus proposer les instances détruites
+    if os.path.exists(POOL_STATE_PATH):
+        InstancePool().forget(destroyed)
+    return EXIT_OK if len(destroyed) == len(matched) else EXIT_TEARDOWN_FAILED
+
+
+def cli(argv: List[str]) -> int:
+    """Ligne de commande : run (défaut), destroy, analyze, import-csv ; renvoie le code de sortie"""
+    global PROBE_SAMPLES, MATRIX_REGIONS
+    import argparse
+    parser = argparse.ArgumentParser(
+        prog="latency-multi-geo.py",
+        description="Déploiement Vultr multi-région et mesure de latence vers les CEX/DEX",
+        epilog="Codes de sortie: 0 ok, 1 aucune mesure, 2 usage/configuration, "
+               "3 régions sans mesure, 4 instances non détruites.",
+    )
+    commands = parser.add_subparsers(dest="command", metavar="{run,destroy,analyze,import-csv}")
+    run = commands.add_parser("run", help="déployer, mesurer, rapporter puis détruire (commande par défaut)")
+    run.add_argument("--config", help="fichier JSON d'options (clés = options longues, ex. "
+                                      "{\"regions\": \"nrt,fra\", \"duration\": 1}) ; la ligne de commande prime")
+    run.add_argument("--regions", help=f"codes de régions séparés par des virgules (défaut {','.join(DEPLOY_REGIONS)})")
+    run.add_argument("--duration", type=float, help="durée en minutes, 0 = une passe (défaut: demandée, 5 sans terminal)")
+    run.add_argument("--samples", type=int, help=f"échantillons http par endpoint et par mesure (défaut {PROBE_SAMPLES})")
+    run.add_argument("--output", help="fichier .csv, sinon dossier du store Parquet")
+    run.add_argument("--destroy", choices=["auto", "always", "keep"], default="auto",
+                     help="auto: question en interactif, destruction sinon ; always: détruire (pool compris) ; "
+                          "keep: conserver (rendues au pool si INSTANCE_POOL)")
+    run.add_argument("--dry-run", action="store_true", help="afficher le plan et le coût estimé sans appel API")
+    teardown = commands.add_parser("destroy", help="détruire des instances existantes par préfixe de label et/ou tag")
+    teardown.add_argument("--label-prefix", help="ex. arb-test- (label des instances créées par run)")
+    teardown.add_argument("--tag", help="ex. arb-test-pool")
+    teardown.add_argument("--dry-run", action="store_true", help="lister sans détruire")
+    # analyze a son propre parser : ses arguments lui sont transmis tels quels
+    commands.add_parser("analyze", add_help=False, help="tendances et régressions de l'historique (analyze --help)")
+    imports = commands.add_parser("import-csv", help="importer des CSV de runs précédents dans le store Parquet")
+    imports.add_argument("paths", nargs="+")
+
+    if argv and argv[0] == "analyze":
+        return analyze_main(argv[1:])
+    # Sans sous-commande : run (usage historique `python latency-multi-geo.py`)
+    if not argv or (argv[0] not in commands.choices and argv[0] not in ("-h", "--help")):
+        argv = ["run", *argv]
+    args = parser.parse_args(argv)
+
+    if args.command == "import-csv":
+        import_csv_files(args.paths)
+        return EXIT_OK
+    if args.command == "destroy":
+        if not (args.label_prefix or args.tag):
+            teardown.error("--label-prefix ou --tag requis")
+    elif args.config:
+        # Options du fichier converties en arguments, placées avant ceux de la ligne de commande (qui priment)
+        try:
+            with open(args.config) as f:
+                options = json.load(f)
+        except (OSError, ValueError) as e:
+            run.error(f"--config {args.config}: {e}")
+        config_argv = []
+        for key, value in options.items():
+            flag = "--" + key.replace("_", "-")
+            if isinstance(value, bool):
+                config_argv += [flag] if value else []
+            elif isinstance(value, list):
+                config_argv += [flag, ",".join(map(str, value))]
+            else:
+                config_argv += [flag, str(value)]
+        args = run.parse_args(config_argv + argv[1:])
+        args.command = "run"
+
+    if args.command == "run":
+        regions = [r.strip().lower() for r in args.regions.split(",") if r.strip()] if args.regions else None
+        if MATRIX_MODE and regions:
+            MATRIX_REGIONS = regions
+        unknown = [region for region in regions or DEPLOY_REGIONS if region not in REGION_EXCHANGE_MAP]
+        if unknown and not MATRIX_MODE:
+            run.error(f"région(s) absente(s) de REGION_EXCHANGE_MAP: {', '.join(unknown)}")
+        if args.duration is not None and args.duration < 0:
+            run.error("--duration doit être positive ou nulle")
+        if args.samples is not None:
+            if args.samples < 1:
+                run.error("--samples doit être au moins 1")
+            PROBE_SAMPLES = args.samples
+        if args.dry_run:
+            print_plan(regions or DEPLOY_REGIONS, args.duration, args.destroy, args.output)
+            return EXIT_OK
+
+    if not VULTR_API_KEY:
+        print("❌ Erreur: Variable VULTR_API_KEY non définie")
+        print("   Export: export VULTR_API_KEY='your-api-key'")
+        return EXIT_USAGE
+    if args.command == "destroy":
+        return destroy_main(args.label_prefix, args.tag, args.dry_run)
+    # Span racine : le contexte est copié dans la boucle, chaque phase du run en devient l'enfant
+    try:
+        with TRACER.span('run'):
+            return asyncio.run(main(regions, args.duration, args.destroy, args.output))
+    finally:
+        TRACER.close()
+
+
+if __name__ == "__main__":
+    sys.exit(cli(sys.argv[1:]))